@@ -12,4 +12,5 @@ pip install .
 # Run async server which tests scripts/osmo_ctrl.py interaction
 $PY3 tests/test_py3.py
 
-# TODO: add more tests
+# Unit tests: suites for scripts whose dependencies (twisted, suds, treq) are missing skip themselves
+$PY3 -m unittest discover -v tests
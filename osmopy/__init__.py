@@ -1,4 +1,4 @@
 #!/usr/bin/env python3
 __version__ = '0.3.0'
 
-__all__ = ['obscvty', 'osmoutil', 'osmo_ipa', 'osmo_interact', 'trap_helper', 'twisted_ipa']
+__all__ = ['obscvty', 'osmoutil', 'osmo_ipa', 'osmo_interact', 'ipa_writer', 'reconnect', 'trap_helper', 'twisted_ipa']
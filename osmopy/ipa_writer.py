@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- mode: python-mode; py-indent-tabs-mode: nil -*-
+"""
+/*
+ * Copyright (C) 2019 sysmocom s.f.m.c. GmbH
+ *
+ * All Rights Reserved
+ *
+ * This program is free software; you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation; either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ */
+"""
+
+class CoalescingWriter(object):
+    """
+    Output layer shared by Twisted and asyncio code: collect IPA messages written within single reactor/event loop tick
+    and pass them to the transport at once, via Twisted's transport.writeSequence() or asyncio's StreamWriter.writelines()
+    The buffer is flushed earlier if it holds more than max_bytes or max_count messages.
+    """
+    def __init__(self, write_seq, call_soon=None, max_bytes=65536, max_count=256):
+        """
+        write_seq(list) writes list of messages, call_soon(f) schedules f() at the end of current tick:
+        reactor.callLater(0, f) with Twisted and loop.call_soon(f) with asyncio.
+        Without call_soon it's up to the caller to flush().
+        """
+        self.write_seq = write_seq
+        self.call_soon = call_soon
+        self.max_bytes = max_bytes
+        self.max_count = max_count
+        self.pending = []
+        self.size = 0
+        self.scheduled = False
+
+    def write(self, data):
+        """
+        Queue single message
+        """
+        self.pending.append(data)
+        self.size += len(data)
+        if self.size >= self.max_bytes or len(self.pending) >= self.max_count:
+            self.flush()
+        elif self.call_soon and not self.scheduled:
+            self.scheduled = True
+            self.call_soon(self._scheduled_flush)
+
+    def _scheduled_flush(self):
+        self.scheduled = False
+        self.flush()
+
+    def flush(self):
+        """
+        Write all queued messages at once
+        """
+        if self.pending:
+            data = self.pending
+            self.pending = []
+            self.size = 0
+            self.write_seq(data)
+
+    def discard(self):
+        """
+        Drop queued messages, e. g. when connection is lost
+        """
+        self.pending = []
+        self.size = 0
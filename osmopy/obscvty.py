@@ -26,7 +26,7 @@ import time
 
 Specify a VTY to connect to, and run commands on it.
 Connections will be reestablished as necessary.
-Methods: __init__, command, enabled_command, verify, w_verify"""
+Methods: __init__, command, commands, enabled_command, verify, w_verify"""
 
 debug_tcp_sockets = (os.getenv('OSMOPY_DEBUG_TCP_SOCKETS', '0') != '0')
 
@@ -56,6 +56,7 @@ class VTYInteract(object):
     port is the port to connect on"""
 
     all_sockets = []
+    prompt_overlap = 256 # bytes of previously received data to look at when searching for the prompt
 
     def __init__(self, name, host, port):
         print_used_tcp_sockets()
@@ -67,7 +68,10 @@ class VTYInteract(object):
         self.socket = None
         self.norm_end = re.compile(r'\r\n%s(?:\(([\w-]*)\))?> $' % self.name)
         self.priv_end = re.compile(r'\r\n%s(?:\(([\w-]*)\))?# $' % self.name)
+        # any prompt, not necessarily at the end: used to split replies to pipelined commands
+        self.any_end = re.compile(br'\r\n' + re.escape(self.name.encode()) + br'(?:\(([\w-]*)\))?[>#] ')
         self.last_node = ''
+        self.last_priv = False
 
     def _connect_socket(self):
         if self.socket is not None:
@@ -113,6 +117,8 @@ class VTYInteract(object):
                     len(VTYInteract.all_sockets)))
         self.socket.close()
         self.socket = None
+        self.last_node = ''
+        self.last_priv = False
 
     def _is_end(self, text, ends):
         """
@@ -164,6 +170,7 @@ class VTYInteract(object):
             match = end.search(text)
             if match:
                 self.last_node = match.group(1)
+                self.last_priv = end is self.priv_end
                 return match.end() - match.start()
         return 0
 
@@ -176,21 +183,24 @@ class VTYInteract(object):
 
         # Now send the command
         self.socket.send(("%s\r" % request).encode())
-        res = ""
-        end = ""
+        buf = bytearray()
+        end = 0
 
         # Unfortunately, timeout and recv don't always play nicely
         while True:
-            data = self.socket.recv(4096).decode()
-            res = "%s%s" % (res, data)
-            if not res:  # yes, this is ugly
+            data = self.socket.recv(4096)
+            if not data:  # yes, this is ugly
                 raise IOError("Failed to read data (did the app crash?)")
-            end = self._is_end(res, ends)
+            buf += data
+            # the prompt is at the very end: only look at new data and some of the old one in case the prompt was split
+            tail = buf[-(len(data) + self.prompt_overlap):].decode(errors='ignore')
+            end = self._is_end(tail, ends)
             if end > 0:
                 break
 
         if close:
             self._close_socket()
+        res = buf.decode()
         return res[len(request) + 2: end * -1]
 
     """A generator function yielding lines separated by delim.
@@ -201,26 +211,117 @@ class VTYInteract(object):
             print line
     """
     def readlines(self, recv_buffer=4096, delim='\n'):
-        buffer = ''
+        buf = bytearray()
+        delim = delim.encode()
+        start = 0 # everything before this offset has been yielded already
         data = True
         while data:
-            data = self.socket.recv(recv_buffer).decode()
-            buffer += data
-
-            while buffer.find(delim) != -1:
-                line, buffer = buffer.split('\n', 1)
-                yield line
+            data = self.socket.recv(recv_buffer)
+            # only search the new data (and the end of old data if delim is longer than one byte)
+            pos = max(start, len(buf) - len(delim) + 1)
+            buf += data
+            while True:
+                pos = buf.find(delim, pos)
+                if pos == -1:
+                    break
+                yield buf[start:pos].decode()
+                start = pos = pos + len(delim)
+            if start > recv_buffer:
+                del buf[:start]
+                start = 0
         return
 
     # There's no close parameter, as close=True makes this useless
     def enable(self):
-        self.command("enable")
+        if self.socket is None or not self.last_priv:
+            self.command("enable")
 
     """Run a command on the vty"""
 
     def command(self, request, close=False):
         return self._common_command(request, close)
 
+    def _skip_redundant(self, requests):
+        """Predict node changes caused by requests: returns [(index, request), ...]
+        without 'enable' and 'configure terminal' which would not change anything.
+        Node '' means unknown: anything unrecognized might have changed the node.
+
+            >>> vty = VTYInteract('OsmoNAT', 'localhost', 9999)
+            >>> vty._skip_redundant(['enable', 'show version', 'enable', 'configure terminal', 'configure terminal', 'nat', 'configure terminal'])
+            [(0, 'enable'), (1, 'show version'), (3, 'configure terminal'), (5, 'nat'), (6, 'configure terminal')]
+        """
+        priv = self.last_priv
+        node = self.last_node
+        send = []
+        for (i, request) in enumerate(requests):
+            r = ' '.join(request.split())
+            if r == 'enable':
+                if priv:
+                    continue
+                (priv, node) = (True, None)
+            elif r == 'disable':
+                (priv, node) = (False, None)
+            elif r == 'configure terminal' and priv:
+                if node == 'config':
+                    continue
+                node = 'config'
+            elif r == 'end' and priv:
+                node = None
+            else:
+                node = ''
+            send.append((i, request))
+        return send
+
+    """Run several commands at once
+
+    All the commands are sent in a single write, the replies are split at the
+    prompts: a prompt only counts if it's followed by the echo of the next command.
+    Redundant 'enable' and 'configure terminal' commands are not sent at all.
+    Returns the list of replies, one for every request ('' for skipped ones)"""
+    def commands(self, requests, close=False):
+        replies = [''] * len(requests)
+        send = self._skip_redundant(requests)
+        if not send:
+            return replies
+
+        self._connect_socket()
+        self.socket.sendall(''.join("%s\r" % r for (_, r) in send).encode())
+        buf = bytearray()
+        pos = 0 # start of the reply to send[n]
+        scan = 0 # where to continue searching for the prompt
+        n = 0
+        while n < len(send):
+            data = self.socket.recv(4096)
+            if not data:
+                raise IOError("Failed to read data (did the app crash?)")
+            buf += data
+            while n < len(send):
+                match = self.any_end.search(buf, scan)
+                if not match:
+                    scan = max(scan, len(buf) - self.prompt_overlap)
+                    break
+                if n + 1 < len(send):
+                    echo = send[n + 1][1].encode()
+                    following = bytes(buf[match.end():match.end() + len(echo)])
+                    if len(following) < len(echo) and echo.startswith(following):
+                        scan = match.start() # wait for more data
+                        break
+                    if following != echo:
+                        scan = match.start() + 1 # prompt-like text in the output
+                        continue
+                elif match.end() != len(buf):
+                    scan = match.start() + 1
+                    continue
+                (i, request) = send[n]
+                replies[i] = buf[pos:match.start()].decode()[len(request) + 2:]
+                pos = scan = match.end()
+                n += 1
+
+        self._is_end(buf[-self.prompt_overlap:].decode(errors='ignore'), [self.norm_end, self.priv_end])
+        if close:
+            self._close_socket()
+        return replies
+
     """Run enable, followed by another command"""
     def enabled_command(self, request, close=False):
         self.enable()
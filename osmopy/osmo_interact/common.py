@@ -33,6 +33,124 @@ import traceback
 import socket
 import shlex
 import re
+import selectors
+import tempfile
+import multiprocessing
+import hashlib
+import shutil
+
+from osmopy import __version__ as osmopy_version
+from osmopy import osmoutil
+
+
+class LinePattern:
+    '''
+    Expected response lines compiled once into a list of operations:
+    - '...' matches any number of arbitrary lines,
+    - '... !regex' matches any number of lines which regex does not match (re.search),
+    - '~/regex/' matches a single line which regex matches entirely (re.fullmatch),
+    - any other line matches exactly this line.
+    match() runs all possible alignments at once (NFA simulation), so it takes at
+    most len(expect) * len(got) steps and never gets confused by a line following
+    a wildcard which occurs more than once.
+
+        >>> LinePattern(['a', '...', 'b', 'c']).match(['a', 'b', 'x', 'b', 'c'])
+        True
+        >>> LinePattern(['~/[0-9]+ bytes/', '... !error']).match(['42 bytes', 'fine', 'ok'])
+        True
+        >>> print(LinePattern(['a', '... !error', 'c']).match(['a', 'b', 'an error', 'c']))
+        Got forbidden line for wildcard '... !error': did not expect 'an error' in line 2 of response
+          a
+          b
+        - c
+        + an error
+        + c
+    '''
+    ANY = '...'
+    ANY_EXCEPT = '... !'
+    REGEX_START = '~/'
+    REGEX_END = '/'
+
+    def __init__(self, expect):
+        self.expect = list(expect)
+        self.ops = [] # (is wildcard, None or string or compiled regex)
+        for line in self.expect:
+            if line == self.ANY:
+                self.ops.append((True, None))
+            elif line.startswith(self.ANY_EXCEPT):
+                self.ops.append((True, re.compile(line[len(self.ANY_EXCEPT):])))
+            elif (line.startswith(self.REGEX_START) and line.endswith(self.REGEX_END)
+                  and len(line) >= len(self.REGEX_START) + len(self.REGEX_END)):
+                self.ops.append((False, re.compile(line[len(self.REGEX_START):-len(self.REGEX_END)])))
+            else:
+                self.ops.append((False, line))
+
+    def _consumes(self, state, line):
+        (wildcard, arg) = self.ops[state]
+        if wildcard:
+            return arg is None or not arg.search(line)
+        if isinstance(arg, str):
+            return arg == line
+        return arg.fullmatch(line) is not None
+
+    def _skip_wildcards(self, states):
+        # wildcards may match zero lines: whoever reaches one also reaches the next op
+        for s in range(min(states), len(self.ops)):
+            if s in states and self.ops[s][0] and s + 1 not in states:
+                states[s + 1] = (s, False)
+        return states
+
+    def match(self, got):
+        '''
+        Return True on match, or a string describing the mismatch: what went
+        wrong followed by the best partial alignment as a diff.
+        '''
+        # generations[g] maps every state (index in ops) reachable after
+        # consuming got[:g] to how it was reached: (previous state, consumed a line)
+        generations = [self._skip_wildcards({0: None})]
+        for line in got:
+            states = {}
+            for s in generations[-1]:
+                if s < len(self.ops) and self._consumes(s, line):
+                    t = s if self.ops[s][0] else s + 1
+                    if t not in states:
+                        states[t] = (s, True)
+            if not states:
+                break
+            generations.append(self._skip_wildcards(states))
+
+        g = len(generations) - 1
+        if g == len(got) and len(self.ops) in generations[g]:
+            return True
+        return '%s\n%s' % (self._describe(got, generations), '\n'.join(self._diff(got, generations)))
+
+    def _describe(self, got, generations):
+        g = len(generations) - 1
+        best = max(generations[g])
+        if g == len(got):
+            return 'Cannot find line %r' % self.expect[best]
+        for s in sorted(generations[g]):
+            (wildcard, arg) = self.ops[s] if s < len(self.ops) else (False, None)
+            if wildcard and arg is not None and arg.search(got[g]):
+                return ('Got forbidden line for wildcard %r: did not expect %r in line %d of response'
+                        % (self.expect[s], got[g], g))
+        if best == len(self.ops):
+            return 'Did not expect line %r' % got[g]
+        return 'Mismatch in line %d of response:\nExpect:\n%r\nGot:\n%r' % (g, self.expect[best], got[g])
+
+    def _diff(self, got, generations):
+        g = len(generations) - 1
+        best = max(generations[g])
+        matched = []
+        s = best
+        while generations[g][s] is not None:
+            (s, consumed) = generations[g][s]
+            if consumed:
+                g -= 1
+                matched.append('  ' + got[g])
+        g = len(generations) - 1
+        return (matched[::-1] + ['- ' + e for (e, op) in zip(self.expect[best:], self.ops[best:]) if not op[0]]
+                + ['+ ' + l for l in got[g:]])
 
 
 class Interact:
@@ -61,6 +179,7 @@ class Interact:
             assert not "implemented by InteractVty.VtyStep and InteractCtrl.CtrlStep"
 
     socket = None
+    selector = None
 
     def __init__(self, step_class, port, host, verbose=False, update=False):
         '''
@@ -72,12 +191,14 @@ class Interact:
         self.host = host
         self.verbose = verbose
         self.update = update
+        self.latencies = [] # seconds each command took, see recv()
 
         if not port:
             raise Exception("You need to provide port number to connect to")
 
     def connect(self):
         assert self.socket is None
+        self.latencies = []
         retries = 30
         took = 0
         while True:
@@ -93,13 +214,41 @@ class Interact:
                 time.sleep(.1)
                 continue
             break
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.socket, selectors.EVENT_READ)
 
     def close(self):
         if self.socket is None:
             return
+        if self.selector is not None:
+            self.selector.close()
+            self.selector = None
         self.socket.close()
         self.socket = None
 
+    def recv(self, deadline, bufsize=4096):
+        '''
+        Wait until data is available or time.monotonic() reaches deadline,
+        return received data. Raise IOError on timeout or if the connection is closed.
+        '''
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise IOError("Timeout while waiting for data (did the app crash?)")
+            if self.selector.select(remaining):
+                break
+        data = self.socket.recv(bufsize)
+        if not data:
+            raise IOError("Connection closed (did the app crash?)")
+        return data
+
+    def latency_summary(self):
+        if not self.latencies:
+            return 'no commands'
+        l = sorted(self.latencies)
+        return '%d commands in %.3fs, median %.1fms, max %.1fms' % (
+                len(l), sum(l), l[len(l) // 2] * 1000, l[-1] * 1000)
+
     def command(self, command):
         assert not "implemented separately by InteractVty and InteractCtrl"
 
@@ -130,12 +279,17 @@ class Interact:
         # parse steps
         steps = []
         step = None
+        preamble = [] # lines before the first step, e.g. FRESH_INSTANCE_MARK
         blank_lines = 0
         for line in transcript.splitlines():
             if not line:
                 blank_lines += 1
                 continue
             next_step_started = self.Step.is_next_step(line, self)
+            if not (step or next_step_started):
+                preamble.extend([''] * blank_lines + [line])
+                blank_lines = 0
+                continue
             if next_step_started:
                 if step:
                     steps.append(step)
@@ -153,8 +307,10 @@ class Interact:
         if step:
             steps.append(step)
         step = None
+        for step in steps:
+            step.pattern = LinePattern(step.result)
 
-        actual_result = []
+        actual_result = list(preamble)
 
         # run steps
         step_nr = 0
@@ -185,7 +341,7 @@ class Interact:
                     actual_result.extend([''] * step.leading_blanks)
                 actual_result.append(step.command_str(self))
 
-                match_result = self.match_lines(step.result, res)
+                match_result = self.match_lines(step.pattern, res)
 
                 if self.update:
                     if match_result is True:
@@ -213,63 +369,19 @@ class Interact:
         '''
         Match two lists of strings, allowing certain wildcards:
         - In 'expect', if a line is exactly '...', it matches any number of
-          arbitrary lines in 'got'; the implementation is trivial and skips
-          lines to the first occurence in 'got' that continues after '...'.
+          arbitrary lines in 'got'.
         - If an 'expect' line is '... !regex', it matches any number of
           lines like '...', but the given regex must not match any of those
           lines.
+        - If an 'expect' line is '~/regex/', it matches a single line the
+          regex matches entirely.
+        'expect' may also be a LinePattern compiled from such lines.
 
         Return 'True' on match, or a string describing the mismatch.
         '''
-        def match_line(expect_line, got_line):
-            return expect_line == got_line
-
-        ANY = '...'
-        ANY_EXCEPT = '... !'
-
-        e = 0
-        g = 0
-        while e < len(expect):
-            if expect[e] == ANY or expect[e].startswith(ANY_EXCEPT):
-                wildcard = expect[e]
-                e += 1
-                g_end = g
-
-                if e >= len(expect):
-                    # anything left in 'got' is accepted.
-                    g_end = len(got)
-
-                # look for the next occurence of the expected line in 'got'
-                while g_end < len(got) and not match_line(expect[e], got[g_end]):
-                    g_end += 1
-
-                if wildcard == ANY:
-                    # no restrictions on lines
-                    g = g_end
-
-                elif wildcard.startswith(ANY_EXCEPT):
-                    except_re = re.compile(wildcard[len(ANY_EXCEPT):])
-                    while g < g_end:
-                        if except_re.search(got[g]):
-                          return ('Got forbidden line for wildcard %r:'
-                                  ' did not expect %r in line %d of response'
-                                  % (wildcard, got[g], g))
-                        g += 1
-
-                continue
-
-            if g >= len(got):
-                return 'Cannot find line %r' % expect[e]
-
-            if not match_line(expect[e], got[g]):
-                return 'Mismatch:\nExpect:\n%r\nGot:\n%r' % (expect[e], got[g])
-
-            e += 1
-            g += 1
-
-        if g < len(got):
-            return 'Did not expect line %r' % got[g]
-        return True
+        if not isinstance(expect, LinePattern):
+            expect = LinePattern(expect)
+        return expect.match(got)
 
     def feed_commands(self, output, command_strs):
         for command_str in command_strs:
@@ -289,30 +401,7 @@ def end_process(proc, quiet=False):
         proc.wait()
         return
 
-    proc.terminate()
-    time_to_wait_for_term = 5
-    wait_step = 0.001
-    waited_time = 0
-    while True:
-        # poll returns None if proc is still running
-        if proc.poll() is not None:
-            break
-        waited_time += wait_step
-        # make wait_step approach 1.0
-        wait_step = (1. + 5. * wait_step) / 6.
-        if waited_time >= time_to_wait_for_term:
-            break
-        time.sleep(wait_step)
-
-    if proc.poll() is None:
-        # termination seems to be slower than that, let's just kill
-        proc.kill()
-        if not quiet:
-            print("Killed child process")
-    elif waited_time > .002:
-        if not quiet:
-            print("Terminating took %.3fs" % waited_time)
-    proc.wait()
+    osmoutil.terminate(proc, quiet=quiet)
 
 class Application:
     proc = None
@@ -328,6 +417,7 @@ class Application:
         self.command_tuple = shlex.split(run_app_str)
         self.purge_output = purge_output
         self.quiet = quiet
+        self.ready = False
 
     def run(self):
         out_err = None
@@ -338,10 +428,24 @@ class Application:
             print('Launching: cd %r; %s' % (os.getcwd(), ' '.join(self.command_tuple)))
         self.proc = subprocess.Popen(self.command_tuple, stdout=out_err, stderr=out_err)
 
+    def wait_ready(self, port, timeout=10):
+        '''
+        Wait until the application listens on port, raise IOError if it exits
+        or doesn't get there in time. Returns immediately once it was ready.
+        '''
+        if self.proc.poll() is not None:
+            raise IOError('%s has terminated with %d' % (self.command_tuple[0], self.proc.returncode))
+        if self.ready:
+            return
+        took = osmoutil.wait_listening(self.proc, port, timeout)
+        self.ready = True
+        if not self.quiet:
+            print('Started in %.3fs' % took)
+
     def stop(self):
         end_process(self.proc, self.quiet)
 
-def verify_application(run_app_str, interact, transcript_file, verbose):
+def verify_application(run_app_str, interact, transcript_file, verbose, shared_application=None):
     passed = None
     application = None
 
@@ -353,6 +457,8 @@ def verify_application(run_app_str, interact, transcript_file, verbose):
         application.run()
 
     try:
+        if application or shared_application:
+            (application or shared_application).wait_ready(interact.port)
         interact.connect()
         interact.verify_transcript_file(transcript_file)
         passed = True
@@ -360,6 +466,8 @@ def verify_application(run_app_str, interact, transcript_file, verbose):
         traceback.print_exc()
         passed = False
     interact.close()
+    if verbose:
+        print('%s: %s' % (transcript_file, interact.latency_summary()))
 
     if application:
         application.stop()
@@ -369,6 +477,232 @@ def verify_application(run_app_str, interact, transcript_file, verbose):
 
     return passed
 
+PORT_PLACEHOLDER = '@PORT@'
+
+def allocate_ports(first, count):
+    '''
+    Find count ports, starting at first, which nothing is listening on yet.
+    '''
+    ports = []
+    port = first
+    while len(ports) < count:
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            s.bind(('127.0.0.1', port))
+            ports.append(port)
+        except OSError:
+            pass
+        finally:
+            s.close()
+        port += 1
+    return ports
+
+CONFIG_OPTIONS = ('-c', '--config', '--config-file')
+
+def config_files(args):
+    '''
+    Indexes of the arguments naming config files, i.e. following one of CONFIG_OPTIONS.
+    '''
+    return [i + 1 for (i, arg) in enumerate(args[:-1]) if arg in CONFIG_OPTIONS]
+
+def substitute_port(run_app_str, port, tmpdir):
+    '''
+    Replace PORT_PLACEHOLDER in run_app_str as well as in the config files it
+    names: modified copies of those go to tmpdir. Other files (the binary,
+    databases) are never read.
+    Returns the new run_app_str and whether any placeholder was found at all.
+    '''
+    found = False
+    args = shlex.split(run_app_str)
+    configs = config_files(args)
+    for (i, arg) in enumerate(args):
+        if PORT_PLACEHOLDER in arg:
+            found = True
+            args[i] = arg.replace(PORT_PLACEHOLDER, str(port))
+        elif i in configs and os.path.isfile(arg):
+            with open(arg, 'rb') as f:
+                content = f.read()
+            if PORT_PLACEHOLDER.encode() in content:
+                found = True
+                args[i] = os.path.join(tmpdir, '%d-%s' % (i, os.path.basename(arg)))
+                with open(args[i], 'wb') as f:
+                    f.write(content.replace(PORT_PLACEHOLDER.encode(), str(port).encode()))
+    return ' '.join(shlex.quote(a) for a in args), found
+
+FRESH_INSTANCE_MARK = 'needs fresh instance'
+CACHED = 'pass (cached)'
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.digest()
+
+class ResultCache:
+    '''
+    On-disk record of transcripts which passed, keyed by a hash of everything
+    the result depends on: the transcript, the -r command line, the application
+    binary (by path, size and modification time), the config files named on its
+    command line (see config_files()) and the osmopy version. Other files, like
+    databases the application writes to, are not part of the key.
+    Every pass is an empty file named after its key, so parallel workers
+    don't need any locking.
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.app_digests = {}
+        os.makedirs(path, exist_ok=True)
+
+    def app_digest(self, run_app_str):
+        if run_app_str not in self.app_digests:
+            h = hashlib.sha256(run_app_str.encode())
+            args = shlex.split(run_app_str)
+            binary = shutil.which(args[0]) if args else None
+            if binary:
+                st = os.stat(binary)
+                h.update(('%s %d %d' % (os.path.realpath(binary), st.st_size, st.st_mtime_ns)).encode())
+            for i in config_files(args):
+                if os.path.isfile(args[i]):
+                    h.update(file_digest(args[i]))
+            self.app_digests[run_app_str] = h.digest()
+        return self.app_digests[run_app_str]
+
+    def key(self, run_app_str, interact, transcript_file):
+        '''
+        Return the key for the transcript, None if a file it depends on can't
+        be read: such a transcript is never taken from or recorded in the cache.
+        '''
+        try:
+            h = hashlib.sha256(self.app_digest(run_app_str))
+            h.update(('%s %s' % (osmopy_version, type(interact).__name__)).encode())
+            h.update(file_digest(transcript_file))
+        except OSError:
+            return None
+        return h.hexdigest()
+
+    def passed(self, key):
+        return key is not None and os.path.exists(os.path.join(self.path, key))
+
+    def record(self, key):
+        open(os.path.join(self.path, key), 'w').close()
+
+    def clear(self):
+        for name in os.listdir(self.path):
+            os.unlink(os.path.join(self.path, name))
+
+def needs_fresh_instance(transcript_file):
+    '''
+    With a shared application instance, a transcript which relies on the
+    application's initial state has FRESH_INSTANCE_MARK in its first line.
+    '''
+    try:
+        with open(transcript_file, 'r') as f:
+            return FRESH_INSTANCE_MARK in f.readline()
+    except OSError:
+        return False # verifying it is going to fail anyway
+
+def verify_transcripts(run_app_str, transcript_files, interact, verbose, shared=False, cache=None):
+    '''
+    Verify transcripts one after another, returns [(passed, transcript_file), ...]
+    With shared, the application is launched once for all of them: it is only
+    restarted if it has terminated or if a transcript needs_fresh_instance().
+    With cache (a ResultCache), transcripts which passed before are skipped
+    and reported as CACHED, new passes are recorded.
+    '''
+    results = []
+    application = None
+    if not run_app_str or interact.update:
+        cache = None # result depends on an application we know nothing about
+    keys = {} # transcript -> cache key, computed right before it runs
+    with tempfile.TemporaryDirectory(prefix='osmo_interact-') as tmpdir:
+        cache_app_str = run_app_str # the key depends on the original command line
+        if run_app_str:
+            (substituted, found) = substitute_port(run_app_str, interact.port, tmpdir)
+            if found:
+                run_app_str = substituted
+        try:
+            for t in transcript_files:
+                if cache:
+                    keys[t] = cache.key(cache_app_str, interact, t)
+                if cache and cache.passed(keys[t]):
+                    results.append((CACHED, t))
+                    continue
+                if not (shared and run_app_str):
+                    passed = verify_application(run_app_str=run_app_str,
+                                                interact=interact,
+                                                transcript_file=t,
+                                                verbose=verbose)
+                    results.append((passed, t))
+                    continue
+                if application and (application.proc.poll() is not None or needs_fresh_instance(t)):
+                    application.stop()
+                    application = None
+                if not application:
+                    application = Application(run_app_str, purge_output=not verbose)
+                    application.run()
+                passed = verify_application(run_app_str=None,
+                                            interact=interact,
+                                            transcript_file=t,
+                                            verbose=verbose,
+                                            shared_application=application)
+                results.append((passed, t))
+        finally:
+            if cache:
+                for (passed, t) in results:
+                    if passed is True and keys.get(t) is not None:
+                        cache.record(keys[t])
+            if application:
+                application.stop()
+    return results
+
+# state of a verify_parallel() worker process
+_worker = None
+
+def _worker_init(ports, run_app_str, interact, verbose, shared, cache):
+    global _worker
+    interact.port = ports.get()
+    _worker = (run_app_str, interact, verbose, shared, cache)
+
+def _worker_verify(transcript_files):
+    '''
+    Returns the results along with the shutdown times recorded meanwhile:
+    osmoutil.termination_times of the worker is not seen by the parent.
+    '''
+    (run_app_str, interact, verbose, shared, cache) = _worker
+    recorded = len(osmoutil.termination_times)
+    results = verify_transcripts(run_app_str, transcript_files, interact, verbose, shared, cache)
+    return results, osmoutil.termination_times[recorded:]
+
+def verify_parallel(run_app_str, transcript_files, interact, verbose, jobs, shared=False, cache=None):
+    '''
+    Verify transcripts in jobs worker processes, each one with its own
+    application instance listening on its own port: interact.port is the first
+    port to try. With shared, every worker gets an equal share of the
+    transcripts to run against a single application instance.
+    Returns [(passed, transcript_file), ...] in the original order.
+    '''
+    if not run_app_str:
+        raise Exception('Parallel verification needs the application to be launched with -r')
+    with tempfile.TemporaryDirectory() as tmpdir:
+        if not substitute_port(run_app_str, 0, tmpdir)[1]:
+            raise Exception('Parallel verification needs %s in the -r command line or in a config file it names (-c),'
+                            ' so that every application instance listens on its own port' % PORT_PLACEHOLDER)
+    jobs = min(jobs, len(transcript_files))
+    if shared:
+        batches = [transcript_files[i::jobs] for i in range(jobs)]
+    else:
+        batches = [[t] for t in transcript_files]
+    ports = multiprocessing.Queue()
+    for port in allocate_ports(int(interact.port), jobs):
+        ports.put(port)
+    with multiprocessing.Pool(jobs, _worker_init, (ports, run_app_str, interact, verbose, shared, cache)) as pool:
+        results = {}
+        for (batch, times) in pool.map(_worker_verify, batches, chunksize=1):
+            results.update((t, passed) for (passed, t) in batch)
+            osmoutil.termination_times.extend(times)
+    return [(results[t], t) for t in transcript_files]
+
 def common_parser(doc=None):
     parser = argparse.ArgumentParser(description=doc,
                                      formatter_class=argparse.RawDescriptionHelpFormatter)
@@ -389,6 +723,26 @@ def parser_add_verify_args(parser):
                         ' FILES.')
     parser.add_argument('-v', '--verbose', action='store_true',
                         help='Print commands and application output')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='Verify this many transcripts in parallel, each against its own'
+                        ' application instance launched with -r. The port to reach every instance at'
+                        ' is substituted for %s in the -r command line and in the config files named on it'
+                        ' with -c; -p is the first port to try.'
+                        ' Anything else the application writes to, like a database file,'
+                        ' must not be shared either: use %s in its name.' % (PORT_PLACEHOLDER, PORT_PLACEHOLDER))
+    parser.add_argument('-s', '--shared-instance', dest='shared', action='store_true',
+                        help='Launch the application given by -r once and verify all transcripts'
+                        ' against it instead of restarting it for every transcript. A transcript'
+                        ' with %r in its first line still gets a freshly started instance.'
+                        % FRESH_INSTANCE_MARK)
+    parser.add_argument('--cache-dir',
+                        help='Remember which transcripts passed in this directory and skip them'
+                        ' as long as neither the transcript, the application binary, the config'
+                        ' files named with -c on the -r command line nor osmopy change.')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Verify all transcripts even if --cache-dir is given')
+    parser.add_argument('--clear-cache', action='store_true',
+                        help='Forget all results remembered in --cache-dir before verifying')
     parser.add_argument('transcript_files', nargs='*', help='transcript file(s) to verify')
     return parser
 
@@ -417,6 +771,8 @@ def main_run_commands(run_app_str, output_path, cmd_str, cmd_files, interact):
         application.run()
 
     try:
+        if application:
+            application.wait_ready(interact.port)
         interact.connect()
 
         if cmd_str:
@@ -452,20 +808,33 @@ def main_run_commands(run_app_str, output_path, cmd_str, cmd_files, interact):
             except:
                 traceback.print_exc()
 
-def main_verify_transcripts(run_app_str, transcript_files, interact, verbose):
-    results = []
-    for t in transcript_files:
-        passed = verify_application(run_app_str=run_app_str,
-                                    interact=interact,
-                                    transcript_file=t,
-                                    verbose=verbose)
-        results.append((passed, t))
+def result_cache(args):
+    '''
+    ResultCache according to the args of parser_add_verify_args() or None
+    '''
+    if not args.cache_dir:
+        return None
+    cache = ResultCache(args.cache_dir)
+    if args.clear_cache:
+        cache.clear()
+    if args.no_cache:
+        return None
+    return cache
+
+def main_verify_transcripts(run_app_str, transcript_files, interact, verbose, jobs=1, shared=False, cache=None):
+    if jobs > 1 and len(transcript_files) > 1:
+        results = verify_parallel(run_app_str, transcript_files, interact, verbose, jobs, shared, cache)
+    else:
+        results = verify_transcripts(run_app_str, transcript_files, interact, verbose, shared, cache)
+
+    if verbose and osmoutil.termination_times:
+        print('\nSlowest application shutdowns:\n%s' % osmoutil.termination_summary())
 
     print('\nRESULTS:')
     all_passed = True
     for passed, t in results:
-        print('%s: %s' % ('pass' if passed else 'FAIL', t))
-        all_passed = all_passed and passed
+        print('%s: %s' % (CACHED if passed == CACHED else ('pass' if passed else 'FAIL'), t))
+        all_passed = all_passed and bool(passed)
     print()
 
     if not all_passed:
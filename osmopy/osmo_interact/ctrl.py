@@ -25,14 +25,17 @@ is exposed as commandline args by osmo_verify_transcript_ctrl.py.
 '''
 
 import re
+import collections
 
 from .common import *
-from osmopy.osmo_ipa import Ctrl, IPA
+from osmopy.osmo_ipa import Ctrl
 
 class InteractCtrl(Interact):
     next_id = 1
     keep_ids = True
     re_command = re.compile(r'^(SET|GET) ([^ ]*) (.*)$')
+    codec = Ctrl()
+    max_traps = 1000 # older TRAPs are dropped when more are waiting in self.traps
 
     class CtrlStep(Interact.StepBase):
 
@@ -61,24 +64,62 @@ class InteractCtrl(Interact):
 
     def connect(self):
         self.next_id = 1
+        self.rx_buf = bytearray()
+        self.traps = collections.deque(maxlen=self.max_traps) # TRAPs received while waiting for replies
         super().connect()
 
     def send(self, data):
-        data = Ctrl().add_header(data)
+        data = self.codec.add_header(data)
         return self.socket.send(data) == len(data)
 
-    def receive(self):
-        responses = []
-        data = self.socket.recv(4096)
-        while (len(data)>0):
-            (response_with_header, data) = IPA().split_combined(data)
-            response = Ctrl().rem_header(response_with_header)
-            responses.append(response.decode('utf-8'))
-        return responses
+    def receive_frame(self, deadline):
+        '''
+        Read exactly one IPA message, return its payload if it's CTRL, None otherwise.
+        '''
+        while len(self.rx_buf) < 3:
+            self.rx_buf += self.recv(deadline)
+        length = int.from_bytes(self.rx_buf[:2], 'big') + 3
+        while len(self.rx_buf) < length:
+            self.rx_buf += self.recv(deadline, max(4096, length - len(self.rx_buf)))
+        frame = bytes(self.rx_buf[:length])
+        del self.rx_buf[:length]
+        return self.codec.rem_header(frame)
+
+    def receive(self, cmd_id=None, timeout=10):
+        '''
+        Wait for the reply to command cmd_id (or for any reply if cmd_id is None).
+        TRAPs received meanwhile are put on self.traps, replies to other commands are dropped.
+        ERROR replies to unparsable commands carry no id ('err' instead) and are accepted as well.
+        '''
+        deadline = time.monotonic() + timeout
+        while True:
+            response = self.receive_frame(deadline)
+            if response is None:
+                continue
+            response = response.decode('utf-8')
+            (kind, reply_id) = (response.split(' ', 2) + [None])[:2]
+            if kind == 'TRAP':
+                self.traps.append(response)
+                continue
+            if cmd_id is None or reply_id == cmd_id or (kind == 'ERROR' and reply_id in (None, 'err')):
+                return [response]
+
+    def pop_traps(self):
+        '''
+        Return the TRAPs received so far (at most max_traps latest ones) and forget them.
+        '''
+        traps = list(self.traps)
+        self.traps.clear()
+        return traps
 
     def command(self, command):
+        started = time.monotonic()
         assert self.send(command)
-        res = self.receive()
+        parts = command.split(' ', 2)
+        res = self.receive(parts[1] if len(parts) > 1 else None)
+        self.latencies.append(time.monotonic() - started)
+        for trap in self.pop_traps():
+            print('(received %s)' % trap)
         split_responses = []
         for r in res:
             split_responses.extend(r.splitlines())
@@ -169,6 +210,7 @@ A VTY equivalent is osmo_verify_transcript_vty.py.
 
     interact = InteractCtrl(args.port, args.host, args.verbose, args.update, args.keep_ids)
 
-    main_verify_transcripts(args.run_app_str, args.transcript_files, interact, args.verbose)
+    main_verify_transcripts(args.run_app_str, args.transcript_files, interact, args.verbose, args.jobs, args.shared,
+                            result_cache(args))
 
 # vim: tabstop=4 shiftwidth=4 expandtab nocin ai
@@ -25,6 +25,7 @@ is exposed as commandline args by osmo_verify_transcript_vty.py.
 '''
 
 import re
+import codecs
 
 from .common import *
 
@@ -98,40 +99,34 @@ class InteractVty(Interact):
         self.re_prompt = re.compile(r'^%s(?:\(([\w-]*)\))?([#>]) (.*)$' % re.escape(self.prompt))
 
     def _command(self, command_str, timeout=10):
+        started = time.monotonic()
+        deadline = started + timeout
         self.socket.send(command_str.encode())
 
-        waited_since = time.time()
+        decoder = codecs.getincrementaldecoder('utf-8')()
         received_lines = []
         last_line = ''
 
         while True:
-            new_data = self.socket.recv(4096).decode('utf-8')
-
-            last_line = "%s%s" % (last_line, new_data)
-
-            if last_line:
-                # Separate the received response into lines.
-                # But note: the VTY logging currently separates with '\n\r', not '\r\n',
-                # see _vty_output() in libosmocore logging_vty.c.
-                # So we need to jump through hoops to not separate 'abc\n\rdef' as
-                # [ 'abc', '', 'def' ]; but also not to convert '\r\n\r\n' to '\r\n\n' ('\r{\r\n}\n')
-                # Simplest is to just drop all the '\r' and only care about the '\n'.
-                last_line = last_line.replace('\r', '')
-                lines = last_line.splitlines()
-                if last_line.endswith('\n'):
-                    received_lines.extend(lines)
-                    last_line = ""
-                else:
-                    # if pkt buffer ends in the middle of a line, we need to keep
-                    # last non-finished line:
-                    received_lines.extend(lines[:-1])
-                    last_line = lines[-1]
+            # Separate the received response into lines, looking at new data only.
+            # But note: the VTY logging currently separates with '\n\r', not '\r\n',
+            # see _vty_output() in libosmocore logging_vty.c.
+            # So we need to jump through hoops to not separate 'abc\n\rdef' as
+            # [ 'abc', '', 'def' ]; but also not to convert '\r\n\r\n' to '\r\n\n' ('\r{\r\n}\n')
+            # Simplest is to just drop all the '\r' and only care about the '\n'.
+            new_data = decoder.decode(self.recv(deadline)).replace('\r', '')
+            if '\n' in new_data:
+                lines = new_data.split('\n')
+                # if pkt buffer ends in the middle of a line, we need to keep
+                # last non-finished line:
+                received_lines.append(last_line + lines[0])
+                received_lines.extend(lines[1:-1])
+                last_line = lines[-1]
+            else:
+                last_line += new_data
 
             match = self.re_prompt.match(last_line)
             if not match:
-                if time.time() - waited_since > timeout:
-                    raise IOError("Failed to read data (did the app crash?)")
-                time.sleep(.1)
                 continue
 
             self.last_node = self.this_node
@@ -140,6 +135,7 @@ class InteractVty(Interact):
             self.this_prompt_char = match.group(2)
             break
 
+        self.latencies.append(time.monotonic() - started)
         # expecting to have received the command we sent as echo, remove it
         clean_command_str = command_str.strip()
         if clean_command_str.endswith('?'):
@@ -266,6 +262,7 @@ A Control interface equivalent is osmo_verify_transcript_ctrl.py.
 
     interact = InteractVty(args.prompt, args.port, args.host, args.verbose, args.update)
 
-    main_verify_transcripts(args.run_app_str, args.transcript_files, interact, args.verbose)
+    main_verify_transcripts(args.run_app_str, args.transcript_files, interact, args.verbose, args.jobs, args.shared,
+                            result_cache(args))
 
 # vim: tabstop=4 shiftwidth=4 expandtab nocin ai
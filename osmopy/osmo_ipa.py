@@ -24,7 +24,7 @@ class IPA(object):
     """
     Stateless IPA protocol multiplexer: add/remove/parse (extended) header
     """
-    version = "0.0.7"
+    version = "0.0.8"
     TCP_PORT_OML = 3002
     TCP_PORT_RSL = 3003
     # OpenBSC extensions: OSMO, MGCP_OLD
@@ -40,14 +40,17 @@ class IPA(object):
     CTRL_ERR = 'ERROR'
     CTRL_TRAP = 'TRAP'
     CTRL_TRAP_ID = 0
+    # reverse lookup tables: value -> name
+    _PROTO_NAME = dict((v, k) for (k, v) in PROTO.items())
+    _EXT_NAME = dict((v, k) for (k, v) in EXT.items())
+    _MSGT_NAME = dict((v, k) for (k, v) in MSGT.items())
+    _IDTAG_NAME = dict((v, k) for (k, v) in _IDTAG.items())
 
     def _l(self, d, p):
         """
-        Reverse dictionary lookup: return key for a given value
+        Reverse dictionary lookup: return name for a given value using one of the reverse lookup tables above
         """
-        if p is None:
-            return 'UNKNOWN'
-        return list(d.keys())[list(d.values()).index(p)]
+        return d.get(p, 'UNKNOWN')
 
     def _tag(self, t, v):
         """
@@ -59,25 +62,25 @@ class IPA(object):
         """
         Lookup protocol name
         """
-        return self._l(self.PROTO, p)
+        return self._l(self._PROTO_NAME, p)
 
     def ext(self, p):
         """
         Lookup protocol extension name
         """
-        return self._l(self.EXT, p)
+        return self._l(self._EXT_NAME, p)
 
     def msgt(self, p):
         """
         Lookup message type name
         """
-        return self._l(self.MSGT, p)
+        return self._l(self._MSGT_NAME, p)
 
     def idtag(self, p):
         """
         Lookup ID tag name
         """
-        return self._l(self._IDTAG, p)
+        return self._l(self._IDTAG_NAME, p)
 
     def ext_name(self, proto, exten):
         """
@@ -19,6 +19,8 @@ import os
 import sys
 import importlib
 import time
+import select
+import socket
 import unittest
 
 
@@ -26,7 +28,7 @@ import unittest
 
 devnull = None
 
-def popen_devnull(cmd, verbose=True):
+def popen_devnull(cmd, verbose=True, port=None):
     global devnull
     if devnull is None:
         if verbose:
@@ -34,41 +36,141 @@ def popen_devnull(cmd, verbose=True):
         devnull = open(os.devnull, 'w')
     if verbose:
         print("Launching: PWD=%s %s" % (os.getcwd(), ' '.join([repr(c) for c in cmd])))
-    return subprocess.Popen(cmd, stdout=devnull, stderr=devnull)
+    proc = subprocess.Popen(cmd, stdout=devnull, stderr=devnull)
+    if port:
+        try:
+            took = wait_listening(proc, port)
+        except:
+            terminate(proc, quiet=not verbose) # caller never gets proc to clean up
+            raise
+        if verbose:
+            print("Listening on port %d after %.3fs" % (int(port), took))
+    return proc
 
 
-"""End a process.
+"""Check whether anything listens on a local TCP port.
 
-If the process doesn't appear to exist (for instance, is None), do nothing"""
+Looks at /proc/net/tcp and /proc/net/tcp6 where available, tries to connect
+otherwise."""
 
+def is_listening(port):
+    port_hex = ':%04X' % int(port)
+    found_proc = False
+    for path in ('/proc/net/tcp', '/proc/net/tcp6'):
+        try:
+            with open(path) as f:
+                lines = f.readlines()[1:]
+        except IOError:
+            continue
+        found_proc = True
+        for line in lines:
+            fields = line.split()
+            # local address is HEXIP:HEXPORT, state 0A is LISTEN
+            if fields[1].endswith(port_hex) and fields[3] == '0A':
+                return True
+    if found_proc:
+        return False
+    try:
+        socket.create_connection(('127.0.0.1', int(port)), timeout=1).close()
+        return True
+    except IOError:
+        return False
 
-def end_proc(proc):  # -> Optional[int]
-    if not proc:
-        return None
 
-    proc.terminate()
-    time_to_wait_for_term = 5
-    wait_step = 0.001
-    waited_time = 0
+"""Wait until a freshly launched process listens on a local TCP port.
+
+Checks with exponential backoff, raises IOError immediately if the process
+exits and if it doesn't listen after timeout seconds.
+Returns the time it took since the call."""
+
+def wait_listening(proc, port, timeout=10):  # -> float
+    started = time.monotonic()
+    delay = .001
     while True:
-        # poll returns None if proc is still running
-        rc = proc.poll()
+        if is_listening(port):
+            return time.monotonic() - started
+        remaining = started + timeout - time.monotonic()
+        if remaining <= 0:
+            raise IOError("%s is not listening on port %d after %.1fs" % (proc.args, int(port), timeout))
+        rc = wait_exit(proc, min(delay, remaining))
         if rc is not None:
-            break
-        waited_time += wait_step
-        # make wait_step approach 1.0
-        wait_step = (1. + 5. * wait_step) / 6.
-        if waited_time >= time_to_wait_for_term:
-            break
-        time.sleep(wait_step)
-
-    if proc.poll() is None:
+            raise IOError("%s exited with code %d during startup" % (proc.args, rc))
+        delay = min(delay * 2, .1)
+
+
+"""Wait up to timeout seconds (forever if None) for a process to exit.
+
+Returns its return code, or None if it is still running. On Linux the wait
+is woken up by the exit itself via a pidfd, elsewhere subprocess's waitpid
+polling is used."""
+
+def wait_exit(proc, timeout=None):  # -> Optional[int]
+    rc = proc.poll()
+    if rc is not None or (timeout is not None and timeout <= 0):
+        return rc
+    pidfd = None
+    if hasattr(os, 'pidfd_open'):
+        try:
+            pidfd = os.pidfd_open(proc.pid)
+        except OSError:  # e.g. kernel older than 5.3
+            pass
+    if pidfd is not None:
+        try:
+            select.select([pidfd], [], [], timeout)
+        finally:
+            os.close(pidfd)
+        return proc.poll()
+    try:
+        return proc.wait(timeout)
+    except subprocess.TimeoutExpired:
+        return None
+
+
+"""Processes ended by terminate(): (command, seconds until exit, killed)"""
+
+termination_times = []
+
+"""Send SIGTERM to a process, SIGKILL if it's still running after kill_after
+seconds (never if None), return its return code.
+
+The time it took is recorded in termination_times."""
+
+def terminate(proc, kill_after=5, quiet=False):  # -> int
+    started = time.monotonic()
+    proc.terminate()
+    killed = wait_exit(proc, kill_after) is None
+    if killed:
         # termination seems to be slower than that, let's just kill
         proc.kill()
-        print("Killed child process")
-    elif waited_time > .002:
-        print("Terminating took %.3fs" % waited_time)
+        if not quiet:
+            print("Killed child process")
     rc = proc.wait()
+    took = time.monotonic() - started
+    termination_times.append((proc.args, took, killed))
+    if not killed and took > .002 and not quiet:
+        print("Terminating took %.3fs" % took)
+    return rc
+
+
+"""Describe the slowest terminations recorded so far, one per line"""
+
+def termination_summary(count=5):
+    slowest = sorted(termination_times, key=lambda t: t[1], reverse=True)[:count]
+    return '\n'.join('%.3fs%s: %s' % (took, ' (killed)' if killed else '',
+                                       ' '.join(args) if isinstance(args, (list, tuple)) else args)
+                     for (args, took, killed) in slowest)
+
+
+"""End a process.
+
+If the process doesn't appear to exist (for instance, is None), do nothing"""
+
+
+def end_proc(proc):  # -> Optional[int]
+    if not proc:
+        return None
+
+    rc = terminate(proc)
     print("Process returned code: %d" % rc)
     return rc
 
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- mode: python-mode; py-indent-tabs-mode: nil -*-
+"""
+/*
+ * Copyright (C) 2019 sysmocom s.f.m.c. GmbH
+ *
+ * All Rights Reserved
+ *
+ * This program is free software; you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation; either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ */
+"""
+
+import random, time
+
+class TokenBucket(object):
+    """
+    Token bucket rate limiter: 'rate' tokens per second, up to 'burst' tokens saved up
+    """
+    def __init__(self, rate, burst=None, clock=time.monotonic):
+        self.rate = float(rate)
+        self.burst = float(burst if burst else rate)
+        self.clock = clock
+        self.tokens = self.burst
+        self.last = clock()
+
+    def reserve(self):
+        """
+        Take one token: returns number of seconds to wait until the token is actually available (0 if it's available now)
+        Tokens can go negative so concurrent callers are queued one after another instead of retrying in lockstep
+        """
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0
+        return -self.tokens / self.rate
+
+
+class ReconnectPolicy(object):
+    """
+    Reconnect delay policy shared by Twisted and asyncio code: quick first retry followed by exponential backoff
+    with decorrelated jitter (each delay is random between 'base' and 3 times the previous one) capped at 'cap' seconds.
+    If limit_rate() was called, reconnects of all connections in the process are additionally limited by a token bucket.
+    Number of reconnects and time spent disconnected are tracked for statistics.
+    """
+    bucket = None # shared by all instances, see limit_rate()
+
+    def __init__(self, first=0.1, base=0.5, cap=30, clock=time.monotonic):
+        self.first = first
+        self.base = base
+        self.cap = cap
+        self.clock = clock
+        self.prev = base
+        self.attempts = 0 # attempts since last successful connection
+        self.reconnects = 0 # total number of reconnect attempts
+        self.downtime = 0.0 # total time spent disconnected, not including current outage
+        self.down_since = None
+
+    @classmethod
+    def limit_rate(cls, rate, burst=None):
+        """
+        Limit reconnects per second across all connections in the process, rate None or 0 removes the limit
+        """
+        cls.bucket = TokenBucket(rate, burst) if rate else None
+
+    def next_delay(self):
+        """
+        Return delay in seconds before next reconnect attempt
+        """
+        self.attempts += 1
+        self.reconnects += 1
+        if self.attempts == 1:
+            delay = self.first
+        else:
+            self.prev = min(self.cap, random.uniform(self.base, self.prev * 3))
+            delay = self.prev
+        if self.bucket:
+            delay = max(delay, self.bucket.reserve())
+        return delay
+
+    def disconnected(self):
+        """
+        Connection was lost or the attempt to establish it has failed
+        """
+        if self.down_since is None:
+            self.down_since = self.clock()
+
+    def connected(self):
+        """
+        Connection is established: reset backoff, returns duration of the outage which just ended
+        """
+        outage = 0.0
+        if self.down_since is not None:
+            outage = self.clock() - self.down_since
+            self.downtime += outage
+            self.down_since = None
+        self.attempts = 0
+        self.prev = self.base
+        return outage
+
+    def total_downtime(self):
+        """
+        Time spent disconnected including current outage
+        """
+        if self.down_since is None:
+            return self.downtime
+        return self.downtime + self.clock() - self.down_since
@@ -77,11 +77,27 @@ def p_h(v):
     loc = split_type(v)
     return partial(lambda a, i: a[i] if len(a) > i else None, loc)
 
-def reloader(path, script, log, dbg1, dbg2, signum, _):
+def code_mtimes(script):
     """
-    Signal handler: we have to use execl() because twisted's reactor is not restartable due to some bug in twisted implementation
+    Snapshot modification times of the running script and of all loaded osmopy modules
     """
-    log.info("Received Signal %d - restarting..." % signum)
+    base = os.path.dirname(os.path.abspath(__file__))
+    files = [os.path.abspath(script)] + [m.__file__ for m in list(sys.modules.values()) if getattr(m, '__file__', None) and os.path.abspath(m.__file__).startswith(base)]
+    res = {}
+    for f in files:
+        try:
+            res[f] = os.stat(f).st_mtime
+        except OSError:
+            res[f] = None
+    return res
+
+def reloader(path, script, log, dbg1, dbg2, reload_cb, mtimes, signum, _):
+    """
+    Signal handler: adjust log level and call reload_cb() to re-read configuration in-process, keeping connections intact.
+    We still have to use execl() when the code has changed (or there's no reload_cb for SIGHUP/SIGQUIT) because twisted's reactor
+    is not restartable due to some bug in twisted implementation
+    """
+    log.info("Received Signal %d - reloading..." % signum)
     if signum == signal.SIGUSR1 and dbg1 not in sys.argv and dbg2 not in sys.argv:
         sys.argv.append(dbg1) # enforce debug
     if signum == signal.SIGUSR2 and (dbg1 in sys.argv or dbg2 in sys.argv): # disable debug
@@ -89,7 +105,12 @@ def reloader(path, script, log, dbg1, dbg2, signum, _):
             sys.argv.remove(dbg1)
         if dbg2 in sys.argv:
             sys.argv.remove(dbg2)
-    os.execl(path, script, *sys.argv[1:])
+    if code_mtimes(path) != mtimes or (reload_cb is None and signum in (signal.SIGHUP, signal.SIGQUIT)):
+        log.info("Code changed - restarting...")
+        os.execl(path, script, *sys.argv[1:])
+    log.setLevel(logging.DEBUG if dbg1 in sys.argv or dbg2 in sys.argv else logging.INFO)
+    if reload_cb:
+        reload_cb()
 
 def add_keys(inp, params, l):
     """
@@ -119,16 +140,18 @@ def log_init(name, is_debug):
     log.addHandler(logging.StreamHandler(sys.stdout))
     return log
 
-def debug_init(name, is_debug):
+def debug_init(name, is_debug, reload_cb=None):
     """
     Initialize signal handlers and logging
+    Optional reload_cb() is called on every signal to re-read configuration without restarting
     """
     log = log_init(name, is_debug)
 
-    reboot = partial(reloader, os.path.abspath(__file__), os.path.basename(__file__), log, '-d', '--debug') # keep in sync with caller's add_argument()
+    path = os.path.abspath(sys.argv[0])
+    reboot = partial(reloader, path, os.path.basename(path), log, '-d', '--debug', reload_cb, code_mtimes(path)) # keep in sync with caller's add_argument()
     signal.signal(signal.SIGHUP, reboot)
     signal.signal(signal.SIGQUIT, reboot)
-    signal.signal(signal.SIGUSR1, reboot) # restart and enabled debug output
-    signal.signal(signal.SIGUSR2, reboot) # restart and disable debug output
+    signal.signal(signal.SIGUSR1, reboot) # reload and enable debug output
+    signal.signal(signal.SIGUSR2, reboot) # reload and disable debug output
 
     return log
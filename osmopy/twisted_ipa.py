@@ -18,19 +18,59 @@
  */
 """
 
-__version__ = "0.7.1" # bump this on every non-trivial change
+__version__ = "0.13.1" # bump this on every non-trivial change
 
 from osmopy.osmo_ipa import Ctrl, IPA
+from osmopy.ipa_writer import CoalescingWriter
+from osmopy.reconnect import ReconnectPolicy
 from twisted.internet.protocol import ReconnectingClientFactory
-from twisted.internet import reactor
+from twisted.internet import reactor, task
 from twisted.protocols import basic
-import argparse, logging, sys
+from collections import deque
+import argparse, logging, struct, sys
+
+# both codecs are stateless: share single instance instead of creating new one for each message
+_IPA = IPA()
+_CTRL = Ctrl()
 
 class IPACommon(basic.Int16StringReceiver):
     """
     Generic IPA protocol handler: include some routines for simpler subprotocols.
     It's not intended as full implementation of all subprotocols, rather common ground and example code.
+    Messages are dispatched via per-class tables built once when class is defined:
+    IPA protocol byte -> handle_*(), OSMO extension byte -> osmo_*() and CTRL command -> ctrl_*()
+    Output: use write() instead of transport.write(), messages written within one reactor tick are sent together
+    Flow control: handlers which fall behind can call pauseProducing() to stop reading from transport
+    and resumeProducing() to continue with buffered messages.
     """
+    MAX_LENGTH = 0xFFFF # maximum IPA payload length, lower it in derived class to reject big messages early
+    _ka_next = None # delayed call for next keepalive PING
+    _ka_expire = None # delayed call for PONG timeout
+    _ka_sent = None # time when outstanding PING was sent
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._busy = False
+
+    @classmethod
+    def build_dispatch(cls):
+        """
+        Build dispatch tables for given class: handlers are looked up by name so derived classes can override them as usual
+        """
+        cls._proto_dispatch = dict((v, getattr(cls, 'handle_' + k, cls.handle_UNKNOWN)) for (k, v) in IPA.PROTO.items())
+        cls._osmo_dispatch = dict((v, getattr(cls, 'osmo_' + k, cls.osmo_UNKNOWN)) for (k, v) in IPA.EXT.items())
+        cls._ctrl_dispatch = dict((n[len('ctrl_'):], getattr(cls, n)) for n in dir(cls) if n.startswith('ctrl_'))
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.build_dispatch()
+
+    def write(self, data):
+        """
+        Queue IPA message for sending, see CoalescingWriter
+        """
+        self.out.write(data)
+
     def dbg(self, line):
         """
         Debug print helper
@@ -101,9 +141,59 @@ class IPACommon(basic.Int16StringReceiver):
     def handle_CCM(self, data, proto, msgt):
         """
         CCM (IPA Connection Management)
-        Placeholder, see corresponding derived class
+        Only keepalive is handled here, see corresponding derived class for the rest
         """
-        pass
+        if msgt == IPA.MSGT['PING']:
+            self.write(_IPA.pong())
+        if msgt == IPA.MSGT['PONG']:
+            self.keepalive_pong()
+
+    def start_keepalive(self):
+        """
+        Schedule next CCM PING if keepalive is enabled in factory
+        """
+        if getattr(self.factory, 'ping_interval', None):
+            self._ka_next = reactor.callLater(self.factory.ping_interval, self.keepalive_ping)
+
+    def stop_keepalive(self):
+        """
+        Cancel all pending keepalive timers
+        """
+        for c in (self._ka_next, self._ka_expire):
+            if c is not None and c.active():
+                c.cancel()
+        self._ka_next = None
+        self._ka_expire = None
+
+    def keepalive_ping(self):
+        """
+        Send keepalive PING and expect PONG within factory's pong_timeout
+        """
+        self._ka_next = None
+        self._ka_sent = reactor.seconds()
+        self.write(_IPA.ping())
+        self._ka_expire = reactor.callLater(self.factory.pong_timeout or self.factory.ping_interval, self.keepalive_expired)
+
+    def keepalive_pong(self):
+        """
+        Record keepalive round-trip time and schedule next PING, unsolicited PONGs are ignored
+        """
+        if self._ka_expire is None:
+            return
+        self._ka_expire.cancel()
+        self._ka_expire = None
+        rtt = reactor.seconds() - self._ka_sent
+        self.factory.record_rtt(rtt)
+        self.dbg('IPA keepalive RTT %.3f ms' % (rtt * 1000))
+        self.start_keepalive()
+
+    def keepalive_expired(self):
+        """
+        Peer did not answer PING in time: abort connection so the factory reconnects
+        """
+        self._ka_expire = None
+        self.factory.log.warning('IPA peer did not answer PING within %s sec, aborting connection' % (self.factory.pong_timeout or self.factory.ping_interval))
+        self.transport.abortConnection()
 
     def handle_SCCP(self, data, proto, extension):
         """
@@ -119,10 +209,9 @@ class IPACommon(basic.Int16StringReceiver):
 
     def handle_OSMO(self, data, proto, extension):
         """
-        Dispatcher point for OSMO subprotocols based on extension name, lambda default should never happen
+        Dispatcher point for OSMO subprotocols based on extension byte
         """
-        method = getattr(self, 'osmo_' + IPA().ext(extension), lambda: "extension dispatch failure")
-        method(data)
+        self._osmo_dispatch.get(extension, self.__class__.osmo_UNKNOWN)(self, data)
 
     def handle_MGCP(self, data, proto, extension):
         """
@@ -134,26 +223,45 @@ class IPACommon(basic.Int16StringReceiver):
         """
         Default protocol handler
         """
-        self.dbg('IPA received message for %s (%s) protocol with attribute %s' % (IPA().proto(proto), proto, extension))
+        self.dbg('IPA received message for %s (%s) protocol with attribute %s' % (_IPA.proto(proto), proto, extension))
 
     def process_chunk(self, data):
         """
-        Generic message dispatcher for IPA (sub)protocols based on protocol name, lambda default should never happen
+        Generic message dispatcher for IPA (sub)protocols based on protocol byte
         """
-        (_, proto, extension, content) = IPA().del_header(data)
+        (_, proto, extension, content) = _IPA.del_header(data)
         if content is not None:
-            method = getattr(self, 'handle_' + IPA().proto(proto), lambda: "protocol dispatch failure")
-            method(content, proto, extension)
+            self._proto_dispatch.get(proto, self.__class__.handle_UNKNOWN)(self, content, proto, extension)
 
     def dataReceived(self, data):
         """
         Override for dataReceived from Int16StringReceiver because of inherently incompatible interpretation of length
         If default handler is used than we would always get off-by-1 error (Int16StringReceiver use equivalent of l + 2)
-        """
-        if len(data):
-            (head, tail) = IPA().split_combined(data)
-            self.process_chunk(head)
-            self.dataReceived(tail)
+        Incoming data is buffered until complete IPA message is available, all complete messages are dispatched in a loop
+        """
+        self._buffer += data
+        if self._busy: # re-entered via resumeProducing() from handler: outer loop will take care of the buffer
+            return
+        self._busy = True
+        buf = self._buffer
+        off = 0
+        try:
+            while not self.paused and len(buf) - off >= 3:
+                (length,) = struct.unpack_from('>H', buf, off)
+                if length > self.MAX_LENGTH:
+                    self.lengthLimitExceeded(length)
+                    off = len(buf)
+                    break
+                end = off + 3 + length
+                if end > len(buf):
+                    break
+                with memoryview(buf) as view: # copy single message only, buffer must not be exported while handler runs
+                    chunk = bytes(view[off:end])
+                off = end
+                self.process_chunk(chunk)
+        finally:
+            del buf[:off]
+            self._busy = False
 
     def connectionMade(self):
         """
@@ -163,6 +271,19 @@ class IPACommon(basic.Int16StringReceiver):
         addr = self.transport.getPeer()
         self.dbg('IPA connected to %s:%d peer' % (addr.host, addr.port))
         self.factory.resetDelay()
+        self.out = CoalescingWriter(self.transport.writeSequence, lambda f: reactor.callLater(0, f))
+        self.start_keepalive()
+
+    def connectionLost(self, reason):
+        """
+        Make sure to call this via super() if overriding to stop keepalive timers
+        """
+        self.stop_keepalive()
+        self.out.discard()
+        super().connectionLost(reason)
+
+
+IPACommon.build_dispatch()
 
 
 class CCM(IPACommon):
@@ -170,13 +291,13 @@ class CCM(IPACommon):
     Implementation of CCM protocol for IPA multiplex
     """
     def ack(self):
-        self.transport.write(IPA().id_ack())
+        self.write(_IPA.id_ack())
 
     def ping(self):
-        self.transport.write(IPA().ping())
+        self.write(_IPA.ping())
 
     def pong(self):
-        self.transport.write(IPA().pong())
+        self.write(_IPA.pong())
 
     def handle_CCM(self, data, proto, msgt):
         """
@@ -184,19 +305,22 @@ class CCM(IPACommon):
         Only basic logic necessary for tests is implemented (ping-pong, id ack etc)
         """
         if msgt == IPA.MSGT['ID_GET']:
-            self.transport.getHandle().sendall(IPA().id_resp(self.factory.ccm_id))
+            self.transport.getHandle().sendall(_IPA.id_resp(self.factory.ccm_id))
             # if we call
-            # self.transport.write(IPA().id_resp(self.factory.test_id))
+            # self.transport.write(_IPA.id_resp(self.factory.test_id))
             # instead, than we would have to also call
             # reactor.callLater(1, self.ack)
             # instead of self.ack()
             # otherwise the writes will be glued together - hence the necessity for ugly hack with 1s timeout
             # Note: this still might work depending on the IPA implementation details on the other side
             self.ack()
-            # schedule PING in 4s
-            reactor.callLater(4, self.ping)
+            # schedule PING in 4s unless periodic keepalive is enabled
+            if not self.factory.ping_interval:
+                reactor.callLater(4, self.ping)
         if msgt == IPA.MSGT['PING']:
             self.pong()
+        if msgt == IPA.MSGT['PONG']:
+            self.keepalive_pong()
 
 
 class CTRL(IPACommon):
@@ -241,12 +365,15 @@ class CTRL(IPACommon):
 
     def osmo_CTRL(self, data):
         """
-        OSMO CTRL message dispatcher, lambda default should never happen
+        OSMO CTRL message dispatcher based on command name
         For basic tests only, appropriate handling routines should be replaced: see CtrlServer for example
         """
         (cmd, op_id, v) = data.decode('utf-8').split(' ', 2)
-        method = getattr(self, 'ctrl_' + cmd, lambda: "CTRL unknown command")
-        method(data, op_id, v)
+        method = self._ctrl_dispatch.get(cmd)
+        if method is None:
+            self.dbg('CTRL unknown command %s [%s] %s' % (cmd, op_id, v))
+        else:
+            method(self, data, op_id, v)
 
 
 class IPAServer(CCM):
@@ -262,7 +389,7 @@ class IPAServer(CCM):
         addr = self.transport.getPeer()
         self.factory.log.info('IPA server: connection from %s:%d client' % (addr.host, addr.port))
         super(IPAServer, self).connectionMade()
-        self.transport.write(IPA().id_get())
+        self.write(_IPA.id_get())
 
 
 class CtrlServer(CTRL):
@@ -279,11 +406,11 @@ class CtrlServer(CTRL):
         addr = self.transport.getPeer()
         self.factory.log.info('CTRL server: connection from %s:%d client' % (addr.host, addr.port))
         super(CtrlServer, self).connectionMade()
-        self.transport.write(Ctrl().trap('LOL', 'what'))
-        self.transport.write(Ctrl().trap('rulez', 'XXX'))
+        self.write(_CTRL.trap('LOL', 'what'))
+        self.write(_CTRL.trap('rulez', 'XXX'))
 
     def reply(self, r):
-        self.transport.write(Ctrl().add_header(r))
+        self.write(_CTRL.add_header(r))
 
     def ctrl_SET(self, data, op_id, v):
         """
@@ -300,20 +427,217 @@ class CtrlServer(CTRL):
         self.reply('ERROR %s No variable found' % op_id)
 
 
+class CtrlVar(object):
+    """
+    Variable in CtrlStore: either static value or callbacks
+    get(path) returns the value, set(path, value) returns stored value and may raise ValueError to reject it
+    """
+    def __init__(self, value=None, read_only=False, get=None, set=None):
+        self.value = value
+        self.read_only = read_only
+        self.get = get
+        self.set = set
+
+
+class CtrlStore(object):
+    """
+    Hierarchical CTRL variable store indexed by dotted path
+    Subtree can be delegated to a handler(path, value) which is called with value None for GET
+    GET of 'some.path.*' returns ';'-separated list of variables under some.path
+    """
+    class Node(object):
+        __slots__ = ('children', 'var', 'handler')
+
+        def __init__(self):
+            self.children = {}
+            self.var = None
+            self.handler = None
+
+    def __init__(self):
+        self.root = CtrlStore.Node()
+
+    def _node(self, path, create=False):
+        """
+        Walk the tree: returns (node, None) for exact match, (node, rest) for node with handler or (None, None)
+        """
+        node = self.root
+        comps = path.split('.')
+        for (i, c) in enumerate(comps):
+            if node.handler:
+                return node, '.'.join(comps[i:])
+            nxt = node.children.get(c)
+            if nxt is None:
+                if not create:
+                    return None, None
+                nxt = node.children[c] = CtrlStore.Node()
+            node = nxt
+        return node, None
+
+    def add(self, path, value=None, read_only=False, get=None, set=None):
+        """
+        Add (or replace) variable
+        """
+        self._node(path, True)[0].var = CtrlVar(value, read_only, get, set)
+
+    def delegate(self, path, handler):
+        """
+        Delegate whole subtree to handler
+        """
+        self._node(path, True)[0].handler = handler
+
+    def names(self, node, prefix=''):
+        """
+        Yield relative paths of all variables under given node
+        """
+        for (c, child) in sorted(node.children.items()):
+            if child.var:
+                yield prefix + c
+            for n in self.names(child, prefix + c + '.'):
+                yield n
+
+    def get(self, path):
+        """
+        Return variable value, raise KeyError if there's no such variable
+        """
+        (node, rest) = self._node(path)
+        if node is not None and node.handler:
+            return node.handler(rest or '', None)
+        if node is None and path.endswith('.*'):
+            (node, rest) = self._node(path[:-2])
+            if node is not None and not node.handler:
+                return ';'.join(self.names(node))
+        if node is None or node.handler or node.var is None:
+            raise KeyError(path)
+        if node.var.get:
+            return node.var.get(path)
+        return node.var.value
+
+    def set(self, path, value):
+        """
+        Set variable value and return stored value, raise KeyError for unknown and ValueError for read-only variables
+        """
+        (node, rest) = self._node(path)
+        if node is None:
+            raise KeyError(path)
+        if node.handler:
+            return node.handler(rest or '', value)
+        if node.var is None:
+            raise KeyError(path)
+        if node.var.read_only:
+            raise ValueError('Read Only attribute')
+        if node.var.set:
+            value = node.var.set(path, value)
+        node.var.value = value
+        return value
+
+    def load(self, f):
+        """
+        Load variables from file: 'var value' per line, 'ro var value' for read-only variables, '#' starts comment
+        """
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            ro = line.startswith('ro ')
+            if ro:
+                line = line[3:].lstrip()
+            (var, _, value) = line.partition(' ')
+            self.add(var, value, ro)
+
+
+class RateCounters(object):
+    """
+    Synthesize rate_ctr.* replies for given number of counter groups with given number of counters each
+    Counter values are derived from the time passed since start so they grow like the real ones
+    """
+    INTERVALS = dict(abs=None, per_sec=1, per_min=60, per_hour=3600, per_day=86400)
+
+    def __init__(self, groups, counters):
+        self.groups = ['bts.%d' % i for i in range(groups)]
+        self.known = set(self.groups)
+        self.counters = ['ctr:%d' % i for i in range(counters)]
+        self.start = reactor.seconds()
+
+    def __call__(self, path, value):
+        if value is not None:
+            raise ValueError('Read Only attribute')
+        if path == '*':
+            return ';'.join(self.groups) + ';'
+        (interval, _, group) = path.partition('.')
+        if interval not in self.INTERVALS or group not in self.known:
+            raise KeyError(path)
+        t = reactor.seconds() - self.start
+        span = self.INTERVALS[interval]
+        if span is not None:
+            t = min(t, span)
+        return ''.join('%s %d;' % (c, int(t * (i + 1))) for (i, c) in enumerate(self.counters))
+
+
+class CtrlStandIn(CTRL):
+    """
+    CTRL server backed by factory's CtrlStore: stand-in for osmo-* CTRL interface in tests and benchmarks
+    """
+    def connectionMade(self):
+        super(CtrlStandIn, self).connectionMade()
+        self.factory.clients.add(self)
+
+    def connectionLost(self, reason):
+        self.factory.clients.discard(self)
+        super(CtrlStandIn, self).connectionLost(reason)
+
+    def reply(self, r):
+        self.write(_CTRL.add_header(r))
+
+    def ctrl_GET(self, data, op_id, v):
+        """
+        CTRL GET command: look up variable in the store
+        """
+        try:
+            self.reply('GET_REPLY %s %s %s' % (op_id, v, self.factory.store.get(v)))
+        except KeyError:
+            self.reply('ERROR %s Command not found' % op_id)
+        except ValueError as e:
+            self.reply('ERROR %s %s' % (op_id, e))
+
+    def ctrl_SET(self, data, op_id, v):
+        """
+        CTRL SET command: update variable in the store
+        """
+        (var, _, val) = v.partition(' ')
+        try:
+            self.reply('SET_REPLY %s %s %s' % (op_id, var, self.factory.store.set(var, val)))
+        except KeyError:
+            self.reply('ERROR %s Command not found' % op_id)
+        except ValueError as e:
+            self.reply('ERROR %s %s' % (op_id, e))
+
+
 class IPAFactory(ReconnectingClientFactory):
     """
     Generic IPA Client Factory which can be used to store state for various subprotocols and manage connections
     Note: so far we do not really need separate Factory for acting as a server due to protocol simplicity
+    Keepalive: if ping_interval is set, CCM PING is sent every ping_interval seconds and connection is aborted
+    (and re-established) if PONG does not arrive within pong_timeout (defaults to ping_interval) seconds
+    Reconnect: delays are computed by ReconnectPolicy instead of ReconnectingClientFactory's own backoff
     """
     protocol = IPACommon
     log = None
-    ccm_id = IPA().identity(unit=b'1515/0/1', mac=b'b0:0b:fa:ce:de:ad:be:ef', utype=b'sysmoBTS', name=b'StingRay', location=b'hell', sw=IPA.version.encode('utf-8'))
+    ping_interval = None
+    pong_timeout = None
+    rtt = None # recent keepalive round-trip times, seconds
+    ccm_id = _IPA.identity(unit=b'1515/0/1', mac=b'b0:0b:fa:ce:de:ad:be:ef', utype=b'sysmoBTS', name=b'StingRay', location=b'hell', sw=IPA.version.encode('utf-8'))
 
-    def __init__(self, proto=None, log=None, ccm_id=None):
+    def __init__(self, proto=None, log=None, ccm_id=None, ping_interval=None, pong_timeout=None, policy=None):
+        self.policy = policy if policy else ReconnectPolicy()
         if proto:
             self.protocol = proto
         if ccm_id:
             self.ccm_id = ccm_id
+        if ping_interval:
+            self.ping_interval = ping_interval
+        if pong_timeout:
+            self.pong_timeout = pong_timeout
+        self.rtt = deque(maxlen=100)
         if log:
             self.log = log
         else:
@@ -321,11 +645,57 @@ class IPAFactory(ReconnectingClientFactory):
             self.log.setLevel(logging.CRITICAL)
             self.log.addHandler(logging.NullHandler)
 
+    def record_rtt(self, rtt):
+        """
+        Store keepalive round-trip time
+        """
+        self.rtt.append(rtt)
+
+    def rtt_stats(self):
+        """
+        Return (min, avg, max) of recent keepalive round-trip times or None if there were none
+        """
+        if not self.rtt:
+            return None
+        return min(self.rtt), sum(self.rtt) / len(self.rtt), max(self.rtt)
+
+    def resetDelay(self):
+        """
+        Called by IPACommon.connectionMade(): reset reconnect backoff
+        """
+        outage = self.policy.connected()
+        if outage:
+            self.log.info('IPAFactory reconnected after %.1f sec outage (%d reconnects, %.1f sec disconnected in total)' % (outage, self.policy.reconnects, self.policy.downtime))
+        ReconnectingClientFactory.resetDelay(self)
+
+    def retry(self, connector=None):
+        """
+        Schedule reconnect according to ReconnectPolicy
+        """
+        if not self.continueTrying:
+            return
+        if connector is None:
+            if self.connector is None:
+                raise ValueError("no connector to retry")
+            connector = self.connector
+        self.retries += 1
+        if self.maxRetries is not None and self.retries > self.maxRetries:
+            self.log.info('IPAFactory abandoning reconnect after %d retries' % self.retries)
+            return
+        self.delay = self.policy.next_delay()
+        self.log.debug('IPAFactory will retry in %.2f sec' % self.delay)
+
+        def reconnector():
+            self._callID = None
+            connector.connect()
+        self._callID = reactor.callLater(self.delay, reconnector)
+
     def clientConnectionFailed(self, connector, reason):
         """
         Only necessary for as debugging aid - if we can somehow set parent's class noisy attribute then we can omit this method
         """
         self.log.warning('IPAFactory connection failed: %s' % reason.getErrorMessage())
+        self.policy.disconnected()
         ReconnectingClientFactory.clientConnectionFailed(self, connector, reason)
 
     def clientConnectionLost(self, connector, reason):
@@ -333,9 +703,47 @@ class IPAFactory(ReconnectingClientFactory):
         Only necessary for as debugging aid - if we can somehow set parent's class noisy attribute then we can omit this method
         """
         self.log.warning('IPAFactory connection lost: %s' % reason.getErrorMessage())
+        self.policy.disconnected()
         ReconnectingClientFactory.clientConnectionLost(self, connector, reason)
 
 
+class CtrlStandInFactory(IPAFactory):
+    """
+    Keep variable store and connected clients for CtrlStandIn, publish TRAPs to all clients
+    """
+    protocol = CtrlStandIn
+
+    def __init__(self, store, log=None):
+        super(CtrlStandInFactory, self).__init__(CtrlStandIn, log)
+        self.store = store
+        self.clients = set()
+        self.traps = None
+        self.trap_seq = 0
+        self.trap_credit = 0.0
+
+    def publish(self, var, val):
+        """
+        Send TRAP to every connected client, message is encoded only once
+        """
+        msg = _CTRL.trap(var, val)
+        for c in self.clients:
+            c.write(msg)
+
+    def start_traps(self, rate, var):
+        """
+        Publish TRAP for given variable (with increasing sequence number as value) given number of times per second
+        """
+        interval = max(1.0 / rate, 0.01) # do not tick faster than 100 times per second, send several TRAPs per tick instead
+        def tick():
+            self.trap_credit += rate * interval
+            while self.trap_credit >= 1:
+                self.trap_credit -= 1
+                self.trap_seq += 1
+                self.publish(var, self.trap_seq)
+        self.traps = task.LoopingCall(tick)
+        self.traps.start(interval, now=False)
+
+
 if __name__ == '__main__':
     p = argparse.ArgumentParser("Twisted IPA (module v%s) app" % IPA.version)
     p.add_argument('-v', '--version', action='version', version="%(prog)s v" + __version__)
@@ -347,6 +755,12 @@ if __name__ == '__main__':
     ic = p.add_mutually_exclusive_group()
     ic.add_argument("--ipa", action='store_true', help="use IPA protocol")
     ic.add_argument("--ctrl", action='store_true', help="use CTRL protocol")
+    p.add_argument('--ping-interval', type=float, help="Send IPA CCM PING every given number of seconds")
+    p.add_argument('--pong-timeout', type=float, help="Reconnect if PONG is not received within given number of seconds")
+    p.add_argument('--vars', type=argparse.FileType('r'), help="CTRL server: load variables from file ('[ro] var value' per line)")
+    p.add_argument('--rate-ctr', type=int, nargs=2, metavar=('GROUPS', 'COUNTERS'), help="CTRL server: synthesize rate_ctr.* for given number of groups and counters")
+    p.add_argument('--trap-rate', type=float, help="CTRL server: publish given number of TRAPs per second to every client")
+    p.add_argument('--trap-var', default='stand_in.trap', help="CTRL server: variable name for published TRAPs")
     args = p.parse_args()
     test = False
 
@@ -358,19 +772,27 @@ if __name__ == '__main__':
         if args.client:
             # Start osmo-bsc to receive TRAP messages when osmo-bts-* connects to it
             print('CTRL client, connecting to %s:%d' % (args.host, args.port))
-            reactor.connectTCP(args.host, args.port, IPAFactory(CTRL, log))
+            reactor.connectTCP(args.host, args.port, IPAFactory(CTRL, log, ping_interval=args.ping_interval, pong_timeout=args.pong_timeout))
             test = True
         if args.server:
             # Use bsc_control.py to issue set/get commands
             print('CTRL server, listening on port %d' % args.port)
-            reactor.listenTCP(args.port, IPAFactory(CtrlServer, log))
+            store = CtrlStore()
+            if args.vars:
+                store.load(args.vars)
+            if args.rate_ctr:
+                store.delegate('rate_ctr', RateCounters(*args.rate_ctr))
+            f = CtrlStandInFactory(store, log)
+            reactor.listenTCP(args.port, f)
+            if args.trap_rate:
+                f.start_traps(args.trap_rate, args.trap_var)
             test = True
     if args.ipa:
         if args.client:
             # Start osmo-nitb which would initiate A-bis/IP session
             print('IPA client, connecting to %s ports %d and %d' % (args.host, IPA.TCP_PORT_OML, IPA.TCP_PORT_RSL))
-            reactor.connectTCP(args.host, IPA.TCP_PORT_OML, IPAFactory(CCM, log))
-            reactor.connectTCP(args.host, IPA.TCP_PORT_RSL, IPAFactory(CCM, log))
+            reactor.connectTCP(args.host, IPA.TCP_PORT_OML, IPAFactory(CCM, log, ping_interval=args.ping_interval, pong_timeout=args.pong_timeout))
+            reactor.connectTCP(args.host, IPA.TCP_PORT_RSL, IPAFactory(CCM, log, ping_interval=args.ping_interval, pong_timeout=args.pong_timeout))
             test = True
         if args.server:
             # Start osmo-bts-* which would attempt to connect to us
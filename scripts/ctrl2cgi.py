@@ -18,7 +18,7 @@
  */
 """
 
-__version__ = "0.1.1" # bump this on every non-trivial change
+__version__ = "0.1.5" # bump this on every non-trivial change
 
 import argparse, os, logging, logging.handlers, datetime
 import hashlib
@@ -31,6 +31,7 @@ from treq import post, collect
 from osmopy.trap_helper import debug_init, get_type, get_r, p_h, gen_hash, make_params, comm_proc
 from osmopy.twisted_ipa import CTRL, IPAFactory, __version__ as twisted_ipa_version
 from osmopy.osmo_ipa import Ctrl
+from osmopy.reconnect import ReconnectPolicy
 
 # we don't support older versions of TwistedIPA module
 assert V(twisted_ipa_version) > V('0.4')
@@ -62,6 +63,29 @@ def make_async_req(ts, dst, par, f_write, f_log, tout):
     d.addErrback(lambda e: f_log.critical("HTTP POST error %s while trying to register BSC %s on %s (timeout %d)" % (repr(e), par['bsc_id'], dst, tout))) # handle HTTP errors
     return d
 
+class ResizableSemaphore(defer.DeferredSemaphore):
+    """
+    DeferredSemaphore with adjustable limit: waiting requests are started if more slots became available,
+    requests already in-flight are not affected when limit is decreased - the slots they release are absorbed
+    until the number of in-flight requests fits the new limit
+    """
+    deficit = 0 # number of released slots to absorb
+
+    def set_limit(self, limit):
+        available = limit - (self.limit - self.tokens + self.deficit) # new limit minus in-flight requests
+        self.limit = limit
+        self.tokens = max(available, 0)
+        self.deficit = max(-available, 0)
+        while self.tokens > 0 and self.waiting:
+            self.tokens -= 1
+            self.waiting.pop(0).callback(self)
+
+    def release(self):
+        if self.deficit:
+            self.deficit -= 1
+            return
+        defer.DeferredSemaphore.release(self)
+
 class Trap(CTRL):
     """
     TRAP handler (agnostic to factory's client object)
@@ -105,13 +129,17 @@ class Trap(CTRL):
         t = datetime.datetime.now()
         self.factory.log.debug('Preparing request for BSC %s @ %s...' % (params['bsc_id'], t))
         # Ensure that we run only limited number of requests in parallel:
-        self.factory.semaphore.run(make_async_req, t, self.factory.location, params, self.transport.write, self.factory.log, self.factory.timeout)
+        self.factory.semaphore.run(make_async_req, t, self.factory.location, params, self.write, self.factory.log, self.factory.timeout)
 
 
 class TrapFactory(IPAFactory):
     """
     Store CGI information so TRAP handler can use it for requests
     """
+    semaphore = None
+    addr_ctrl = None
+    port_ctrl = None
+
     def __init__(self, proto, log):
         self.log = log
         level = self.log.getEffectiveLevel()
@@ -120,6 +148,33 @@ class TrapFactory(IPAFactory):
         self.log.setLevel(level)
         self.log.debug("Using Osmocom IPA library v%s" % Ctrl.version)
 
+    def load_config(self):
+        """
+        (Re)read config file: safe to call while running, CTRL connection and in-flight requests are kept
+        """
+        config = configparser.ConfigParser(interpolation=None)
+        config.read(self.config_file)
+
+        addr_ctrl = config['main'].get('addr_ctrl', 'localhost')
+        port_ctrl = config['main'].getint('port_ctrl', 4250)
+        if self.addr_ctrl is None:
+            self.addr_ctrl = addr_ctrl
+            self.port_ctrl = port_ctrl
+        elif (addr_ctrl, port_ctrl) != (self.addr_ctrl, self.port_ctrl):
+            self.log.warning("CTRL address change to %s:%d requires restart, ignored" % (addr_ctrl, port_ctrl))
+        self.timeout = config['main'].getint('timeout', 30)
+        limit = config['main'].getint('num_max_conn', 5)
+        if self.semaphore is None:
+            self.semaphore = ResizableSemaphore(limit)
+        else:
+            self.semaphore.set_limit(limit)
+        self.location = config['main'].get('location')
+        self.secret_key = config['main'].get('secret_key')
+        self.ping_interval = config['main'].getfloat('ping_interval', 0) or None # CCM keepalive, applied to next (re)connection
+        self.pong_timeout = config['main'].getfloat('pong_timeout', 0) or None
+        ReconnectPolicy.limit_rate(config['main'].getfloat('reconnect_rate', 0))
+        self.log.info("destination %s (concurrency %d, timeout %d)" % (self.location, self.semaphore.limit, self.timeout))
+
 
 if __name__ == '__main__':
     p = argparse.ArgumentParser(description='Proxy between given GCI service and Osmocom CTRL protocol.')
@@ -128,22 +183,12 @@ if __name__ == '__main__':
     p.add_argument('-c', '--config-file', required=True, help="Path to mandatory config file (in INI format).")
     args = p.parse_args(namespace=TrapFactory)
 
-    log = debug_init('CTRL2CGI', args.debug)
+    log = debug_init('CTRL2CGI', args.debug, lambda: reactor.callFromThread(T.load_config))
 
     T = TrapFactory(Trap, log)
 
-    config = configparser.ConfigParser(interpolation=None)
-    config.read(args.config_file)
-
-    T.addr_ctrl = config['main'].get('addr_ctrl', 'localhost')
-    T.port_ctrl = config['main'].getint('port_ctrl', 4250)
-    T.timeout = config['main'].getint('timeout', 30)
-    T.semaphore = defer.DeferredSemaphore(config['main'].getint('num_max_conn', 5))
-    T.location = config['main'].get('location')
-    T.secret_key = config['main'].get('secret_key')
-
     log.info("CGI proxy v%s starting with PID %d:" % (__version__, os.getpid()))
-    log.info("destination %s (concurrency %d)" % (T.location, T.semaphore.limit))
+    T.load_config()
     log.info("connecting to %s:%d..." % (T.addr_ctrl, T.port_ctrl))
     reactor.connectTCP(T.addr_ctrl, T.port_ctrl, T)
     reactor.run()
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+# -*- mode: python-mode; py-indent-tabs-mode: nil -*-
+"""
+/*
+ * Copyright (C) 2019 sysmocom s.f.m.c. GmbH
+ *
+ * All Rights Reserved
+ *
+ * This program is free software; you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation; either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ */
+"""
+
+__version__ = "0.1.2" # bump this on every non-trivial change
+
+import argparse, asyncio, itertools, logging, os, sys, time
+from fnmatch import fnmatchcase
+from osmopy.osmo_ipa import Ctrl, IPA
+from osmopy.reconnect import ReconnectPolicy
+
+_IPA = IPA() # stateless codec shared by all connections
+
+
+async def read_frame(reader):
+    """
+    Read single IPA message: returns (frame, proto, ext, data) where frame is the whole message including header
+    """
+    header = await reader.readexactly(3)
+    frame = header + await reader.readexactly(int.from_bytes(header[:2], 'big'))
+    (_, proto, ext, data) = _IPA.del_header(frame)
+    return frame, proto, ext, data
+
+
+class Mux(Ctrl):
+    """
+    Single upstream CTRL connection re-served to many downstream clients:
+    TRAPs are forwarded to every client as is, command ids are rewritten so replies are routed back to the right client.
+    Concurrent identical GETs share single upstream request, GET replies are cached if TTL is configured for the variable,
+    SET (or TRAP) for the variable invalidates its cache entry. Statistics are available to clients via GET mux.*
+    N. B: keep async/await semantics out of it.
+    """
+    def __init__(self, log, max_buffer, ttl_rules=None):
+        super().__init__()
+        self.log = log
+        self.max_buffer = max_buffer
+        self.ttl_rules = list(ttl_rules or []) # [(pattern, ttl), ...] first matching pattern wins
+        self.upstream = None # StreamWriter of upstream connection
+        self.clients = set() # StreamWriters of downstream connections
+        self.pending = {} # upstream id -> (GET variable or None, [(client, client's id), ...])
+        self.inflight = {} # GET variable -> upstream id
+        self.cache = {} # variable -> (expiry time, value)
+        self.stats = dict(hit=0, miss=0, coalesced=0)
+        self.ids = itertools.count(1)
+
+    def ttl(self, var):
+        for (pattern, ttl) in self.ttl_rules:
+            if fnmatchcase(var, pattern):
+                return ttl
+        return 0
+
+    def send(self, w, msg):
+        """
+        Write message to client, drop the client if it can't keep up
+        """
+        if w.transport.get_write_buffer_size() > self.max_buffer:
+            self.log.warning('Client %s is too slow, disconnecting', w.get_extra_info('peername'))
+            self.clients.discard(w)
+            w.close()
+            return
+        w.write(msg)
+
+    def reply(self, w, cmd, cid, rest):
+        if w in self.clients:
+            self.send(w, self.add_header('%s %s %s' % (cmd, cid, rest)))
+
+    def local_get(self, var):
+        """
+        Value of mux.* statistics variable or None
+        """
+        if var == 'mux.clients':
+            return len(self.clients)
+        if var.startswith('mux.cache.'):
+            return self.stats.get(var[len('mux.cache.'):])
+        return None
+
+    def from_upstream(self, frame, proto, ext, data):
+        """
+        Handle message received from upstream.
+        """
+        if proto == self.PROTO['CCM']:
+            if ext == self.MSGT['PING']:
+                self.upstream.write(_IPA.pong())
+            return
+        if proto != self.PROTO['OSMO'] or ext != self.EXT['CTRL']:
+            return
+        if data.startswith(b'TRAP '):
+            if self.cache:
+                self.cache.pop(data.split(b' ', 3)[2].decode('utf-8'), None)
+            for w in list(self.clients):
+                self.send(w, frame) # no need to re-encode
+            return
+        (cmd, i, rest) = (data.decode('utf-8').split(' ', 2) + [''])[:3]
+        dst = self.pending.pop(i, None)
+        if dst is None:
+            self.log.debug('Dropping reply %s %s for unknown request', cmd, i)
+            return
+        (var, waiters) = dst
+        if var is not None and self.inflight.get(var) == i: # not invalidated by SET while in-flight
+            del self.inflight[var]
+            ttl = self.ttl(var)
+            if ttl and cmd == self.CTRL_GET + '_' + self.CTRL_REP:
+                self.cache[var] = (time.monotonic() + ttl, rest)
+        if cmd == self.CTRL_SET + '_' + self.CTRL_REP:
+            self.cache.pop(rest.split(' ', 1)[0], None)
+        for (w, cid) in waiters:
+            self.reply(w, cmd, cid, rest)
+
+    def from_client(self, w, frame, proto, ext, data):
+        """
+        Handle message received from downstream client.
+        """
+        if proto == self.PROTO['CCM']:
+            if ext == self.MSGT['PING']:
+                w.write(_IPA.pong())
+            return
+        if proto != self.PROTO['OSMO'] or ext != self.EXT['CTRL']:
+            return
+        (cmd, cid, rest) = (data.decode('utf-8').split(' ', 2) + [''])[:3]
+        var = rest.split(' ', 1)[0]
+        if cmd == self.CTRL_GET:
+            val = self.local_get(var)
+            if val is not None:
+                self.reply(w, self.CTRL_GET + '_' + self.CTRL_REP, cid, '%s %s' % (var, val))
+                return
+            cached = self.cache.get(var)
+            if cached and cached[0] > time.monotonic():
+                self.stats['hit'] += 1
+                self.reply(w, self.CTRL_GET + '_' + self.CTRL_REP, cid, cached[1])
+                return
+            i = self.inflight.get(var)
+            if i is not None:
+                self.stats['coalesced'] += 1
+                self.pending[i][1].append((w, cid))
+                return
+            self.stats['miss'] += 1
+        else:
+            self.cache.pop(var, None)
+            self.inflight.pop(var, None) # reply to GET which is in-flight must not be cached
+            var = None
+        if self.upstream is None:
+            self.reply(w, self.CTRL_ERR, cid, 'Upstream CTRL connection is not available')
+            return
+        i = str(next(self.ids))
+        self.pending[i] = (var, [(w, cid)])
+        if var is not None:
+            self.inflight[var] = i
+        self.upstream.write(self.add_header('%s %s %s' % (cmd, i, rest)))
+
+    def upstream_lost(self):
+        """
+        Fail all requests which are still waiting for upstream reply.
+        """
+        self.upstream = None
+        for (_, waiters) in self.pending.values():
+            for (w, cid) in waiters:
+                self.reply(w, self.CTRL_ERR, cid, 'Upstream CTRL connection lost')
+        self.pending = {}
+        self.inflight = {}
+        self.cache = {}
+
+    def client_lost(self, w):
+        """
+        Forget requests of the client which is gone, requests nobody waits for anymore are dropped altogether
+        """
+        self.clients.discard(w)
+        for (i, (var, waiters)) in list(self.pending.items()):
+            waiters[:] = [(c, cid) for (c, cid) in waiters if c is not w]
+            if not waiters:
+                del self.pending[i]
+                if var is not None and self.inflight.get(var) == i:
+                    del self.inflight[var]
+
+
+async def upstream_client(mux, host, port):
+    """
+    (Re)establish upstream CTRL connection and dispatch everything received from it.
+    """
+    policy = ReconnectPolicy()
+    while True:
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+            policy.connected()
+            mux.log.info('Connected to upstream %s:%d', host, port)
+            mux.upstream = writer
+            while True:
+                mux.from_upstream(*await read_frame(reader))
+        except OSError as e:
+            mux.log.info('Upstream %s:%d: %s', host, port, e)
+        except asyncio.IncompleteReadError:
+            mux.log.info('Upstream %s:%d connection lost', host, port)
+        if mux.upstream:
+            mux.upstream.close()
+        mux.upstream_lost()
+        policy.disconnected()
+        await asyncio.sleep(policy.next_delay())
+
+async def downstream_client(mux, reader, writer):
+    """
+    Serve single downstream client.
+    """
+    peer = writer.get_extra_info('peername')
+    mux.log.info('Client %s connected (%d clients)', peer, len(mux.clients) + 1)
+    mux.clients.add(writer)
+    try:
+        while writer in mux.clients:
+            mux.from_client(writer, *await read_frame(reader))
+    except (OSError, asyncio.IncompleteReadError):
+        pass
+    mux.client_lost(writer)
+    writer.close()
+    mux.log.info('Client %s disconnected (%d clients)', peer, len(mux.clients))
+
+
+if __name__ == '__main__':
+    a = argparse.ArgumentParser(description = 'Share single upstream CTRL connection with many local clients.')
+    a.add_argument('-v', '--version', action = 'version', version = ("%(prog)s v" + __version__))
+    a.add_argument('-d', '--host', default = 'localhost', help = "Upstream CTRL address, defaults to localhost")
+    a.add_argument('-p', '--port', type = int, default = 4249, help = "Upstream CTRL port, defaults to 4249")
+    a.add_argument('-l', '--listen', default = 'localhost', help = "Address to serve clients on, defaults to localhost")
+    a.add_argument('-P', '--listen-port', type = int, default = 4250, help = "Port to serve clients on, defaults to 4250")
+    a.add_argument('-u', '--unix', help = "Serve clients on given Unix socket path instead of TCP")
+    a.add_argument('-b', '--max-buffer', type = int, default = 1024 * 1024, help = "Disconnect clients with more than given number of bytes unsent")
+    a.add_argument('-c', '--cache', action = 'append', default = [], metavar = 'PATTERN=TTL',
+                   help = "Cache GET replies for variables matching shell-style PATTERN for TTL seconds, can be repeated")
+    a.add_argument('--debug', action = 'store_true', help = "Enable debug log")
+    args = a.parse_args()
+    rules = []
+    for c in args.cache:
+        (pattern, _, ttl) = c.rpartition('=')
+        try:
+            ttl = float(ttl)
+        except ValueError:
+            pattern = None
+        if not pattern:
+            a.error("invalid cache rule '%s', expected PATTERN=TTL" % c)
+        rules.append((pattern, ttl))
+
+    log = logging.getLogger('CTRLMUX')
+    log.setLevel(logging.DEBUG if args.debug else logging.INFO)
+    log.addHandler(logging.StreamHandler(sys.stdout))
+
+    M = Mux(log, args.max_buffer, rules)
+    handler = lambda r, w: downstream_client(M, r, w)
+    loop = asyncio.get_event_loop()
+    if args.unix:
+        if os.path.exists(args.unix):
+            os.unlink(args.unix)
+        loop.run_until_complete(asyncio.start_unix_server(handler, args.unix))
+        log.info('CTRL mux v%s serving on %s', __version__, args.unix)
+    else:
+        loop.run_until_complete(asyncio.start_server(handler, args.listen, args.listen_port))
+        log.info('CTRL mux v%s serving on %s:%d', __version__, args.listen, args.listen_port)
+    loop.run_until_complete(upstream_client(M, args.host, args.port))
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- mode: python-mode; py-indent-tabs-mode: nil -*-
+"""
+/*
+ * Copyright (C) 2019 sysmocom s.f.m.c. GmbH
+ *
+ * All Rights Reserved
+ *
+ * This program is free software; you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation; either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ */
+"""
+
+__version__ = "0.0.2" # bump this on every non-trivial change
+
+import argparse, logging, resource, sys
+from twisted.internet import reactor, task
+from osmopy.twisted_ipa import CCM, IPAFactory
+from osmopy.osmo_ipa import IPA
+
+_IPA = IPA() # stateless codec shared by all connections
+
+
+def percentile(values, p):
+    """
+    Nearest-rank percentile of sorted list
+    """
+    if not values:
+        return 0
+    return values[min(len(values) - 1, max(0, int(round(p / 100.0 * len(values))) - 1))]
+
+
+class SimStats(object):
+    """
+    Connection setup statistics shared by all simulated connections
+    """
+    def __init__(self, total, log):
+        self.total = total
+        self.log = log
+        self.latency = []
+        self.up = 0
+        self.lost = 0
+
+    def report(self):
+        l = sorted(self.latency)
+        self.log.info('%d/%d connections up, %d lost, %d setups: p50 %.1f ms, p90 %.1f ms, p99 %.1f ms, max %.1f ms' %
+                      (self.up, self.total, self.lost, len(l), percentile(l, 50) * 1000, percentile(l, 90) * 1000,
+                       percentile(l, 99) * 1000, (l[-1] if l else 0) * 1000))
+
+
+class SimCCM(CCM):
+    """
+    Simulated BTS side of IPA connection: answer ID_GET with our identity, confirm ID_ACK and answer PING
+    """
+    def handle_CCM(self, data, proto, msgt):
+        if msgt == IPA.MSGT['ID_GET']:
+            self.write(_IPA.id_resp(self.factory.ccm_id))
+        if msgt == IPA.MSGT['ID_ACK']:
+            self.ack()
+            self.factory.established()
+        if msgt == IPA.MSGT['PING']:
+            self.pong()
+        if msgt == IPA.MSGT['PONG']:
+            self.keepalive_pong()
+
+    def connectionLost(self, reason):
+        self.factory.lost()
+        super(SimCCM, self).connectionLost(reason)
+
+
+class SimFactory(IPAFactory):
+    """
+    Single simulated connection: measure time from connection attempt till CCM identity exchange is complete
+    """
+    def __init__(self, stats, log, ccm_id, ping_interval=None):
+        self.stats = stats
+        self.started = None
+        self.is_up = False
+        super(SimFactory, self).__init__(SimCCM, log, ccm_id, ping_interval)
+
+    def startedConnecting(self, connector):
+        self.started = reactor.seconds()
+
+    def established(self):
+        if self.is_up:
+            return
+        self.is_up = True
+        self.stats.up += 1
+        self.stats.latency.append(reactor.seconds() - self.started)
+
+    def lost(self):
+        if self.is_up:
+            self.is_up = False
+            self.stats.up -= 1
+            self.stats.lost += 1
+
+
+def sim_identity(unit, n):
+    """
+    Make unique CCM identity for n-th simulated BTS from unit id template
+    """
+    return _IPA.identity(unit=(unit % n).encode('utf-8'), mac=('02:00:%02x:%02x:%02x:%02x' % tuple(n.to_bytes(4, 'big'))).encode('utf-8'),
+                        utype=b'sysmoBTS', name=('sim-%d' % n).encode('utf-8'), location=b'simulator', sw=IPA.version.encode('utf-8'))
+
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser(description='Simulate many IPA (BTS) connections to stress-test BSC and NAT components.')
+    p.add_argument('-v', '--version', action='version', version=("%(prog)s v" + __version__))
+    p.add_argument('-d', '--host', default='localhost', help="Address to connect to, defaults to localhost")
+    p.add_argument('-n', '--num', type=int, default=100, help="Number of simulated BTS, defaults to 100")
+    p.add_argument('-f', '--first', type=int, default=1, help="Number of the first simulated BTS, defaults to 1")
+    p.add_argument('-u', '--unit-id', default='%d/0/0', help="Unit ID template, %%d is replaced by BTS number, defaults to %%d/0/0")
+    p.add_argument('-r', '--rate', type=float, default=100, help="Connection attempts per second, defaults to 100")
+    p.add_argument('--rsl', action='store_true', help="Open RSL connection in addition to OML for every BTS")
+    p.add_argument('--ping-interval', type=float, help="Send IPA CCM PING every given number of seconds")
+    p.add_argument('--report', type=float, default=5, help="Statistics report interval in seconds, defaults to 5")
+    p.add_argument('--debug', action='store_true', help="Enable debug log")
+    args = p.parse_args()
+    try:
+        args.unit_id % args.first
+    except (TypeError, ValueError):
+        p.error("unit ID template must contain exactly one %%d: %s" % args.unit_id)
+
+    log = logging.getLogger('IPASim')
+    log.setLevel(logging.DEBUG if args.debug else logging.INFO)
+    log.addHandler(logging.StreamHandler(sys.stdout))
+
+    # every connection needs file descriptor: raise soft limit as far as we're allowed to
+    (soft, hard) = resource.getrlimit(resource.RLIMIT_NOFILE)
+    try:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ValueError, OSError) as e:
+        log.warning('Unable to raise open files limit above %d: %s' % (soft, e))
+
+    ports = [IPA.TCP_PORT_OML, IPA.TCP_PORT_RSL] if args.rsl else [IPA.TCP_PORT_OML]
+    stats = SimStats(args.num * len(ports), log)
+    log.info('IPA simulator v%s: %d connections to %s at %.1f/s' % (__version__, stats.total, args.host, args.rate))
+    i = 0
+    for n in range(args.first, args.first + args.num):
+        ccm_id = sim_identity(args.unit_id, n)
+        for port in ports:
+            reactor.callLater(i / args.rate, reactor.connectTCP, args.host, port, SimFactory(stats, log, ccm_id, args.ping_interval))
+            i += 1
+    task.LoopingCall(stats.report).start(args.report, now=False)
+    reactor.run()
@@ -18,12 +18,14 @@
  */
 """
 
-__version__ = "0.0.2" # bump this on every non-trivial change
+__version__ = "0.0.6" # bump this on every non-trivial change
 
 from functools import partial
 import configparser, argparse, time, os, asyncio, aiohttp
-from osmopy.trap_helper import make_params, gen_hash, log_init, comm_proc
+from osmopy.trap_helper import make_params, gen_hash, debug_init, comm_proc
 from osmopy.osmo_ipa import Ctrl
+from osmopy.ipa_writer import CoalescingWriter
+from osmopy.reconnect import ReconnectPolicy
 
 
 def log_bsc_time(l, rq, task, ts, bsc, msg, *args, **kwargs):
@@ -67,16 +69,42 @@ class Proxy(Ctrl):
         super().__init__()
         self.req = {}
         self.log = log
+        self.ctrl_addr = None
+        self.ctrl_port = None
+        self.concurrency = None
+        self.http_client = None
+        self.policy = ReconnectPolicy()
+        self.load_config()
+
+    def load_config(self):
+        """
+        (Re)read config file: safe to call on running Proxy, CTRL connection and in-flight requests are kept.
+        HTTP session is only replaced if concurrency limit has changed.
+        """
         self.conf = configparser.ConfigParser(interpolation = None)
         self.conf.read(self.config_file)
         self.timeout = self.conf['main'].getint('timeout', 30)
+        self.policy.cap = self.timeout
         self.location = self.conf['main'].get('location')
-        self.ctrl_addr = self.conf['main'].get('addr_ctrl', 'localhost')
-        self.ctrl_port = self.conf['main'].getint('port_ctrl', 4250)
-        self.concurrency = self.conf['main'].getint('num_max_conn', 5)
-        # FIXME: use timeout parameter when available (aiohttp version 3.3) as follows
-        #self.http_client = aiohttp.ClientSession(connector = aiohttp.TCPConnector(limit = self.concurrency), timeout = self.timeout)
-        self.http_client = aiohttp.ClientSession(connector = aiohttp.TCPConnector(limit = self.concurrency))
+        ctrl_addr = self.conf['main'].get('addr_ctrl', 'localhost')
+        ctrl_port = self.conf['main'].getint('port_ctrl', 4250)
+        if self.ctrl_addr is None:
+            self.ctrl_addr = ctrl_addr
+            self.ctrl_port = ctrl_port
+        elif (ctrl_addr, ctrl_port) != (self.ctrl_addr, self.ctrl_port):
+            self.log.warning('CTRL address change to %s:%d requires restart, ignored', ctrl_addr, ctrl_port)
+        ReconnectPolicy.limit_rate(self.conf['main'].getfloat('reconnect_rate', 0))
+        concurrency = self.conf['main'].getint('num_max_conn', 5)
+        if concurrency != self.concurrency:
+            self.concurrency = concurrency
+            old = self.http_client
+            # FIXME: use timeout parameter when available (aiohttp version 3.3) as follows
+            #self.http_client = aiohttp.ClientSession(connector = aiohttp.TCPConnector(limit = self.concurrency), timeout = self.timeout)
+            self.http_client = aiohttp.ClientSession(connector = aiohttp.TCPConnector(limit = self.concurrency))
+            if old:
+                # FIXME: use asyncio.create_task() when available (Python 3.7+).
+                asyncio.ensure_future(close_session(old, [t for (t, _) in self.req.values()], self.timeout))
+        self.log.info('Destination %s (concurrency %d, timeout %d)', self.location, self.concurrency, self.timeout)
 
     def dispatch(self, w, data):
         """
@@ -167,6 +195,15 @@ class Proxy(Ctrl):
             del self.req[bsc]
 
 
+async def close_session(session, tasks, delay):
+    """
+    Close replaced HTTP session once requests which were in-flight during reload are done.
+    """
+    if tasks:
+        await asyncio.wait(tasks)
+    await asyncio.sleep(delay) # let pending responses to be read
+    await session.close()
+
 async def recv_response(log, w, bsc, resp):
     """
     Process json response asynchronously.
@@ -175,7 +212,9 @@ async def recv_response(log, w, bsc, resp):
     if js.get('error'):
         log.info('BSC %s response error: %s', bsc, repr(js.get('error')))
     else:
-        comm_proc(js.get('commands'), bsc, w.write, log)
+        out = CoalescingWriter(w.writelines)
+        comm_proc(js.get('commands'), bsc, out.write, log)
+        out.flush() # all commands at once
         await w.drain() # Trigger Writer's flow control
 
 async def recon_reader(proxy, reader, num_bytes):
@@ -204,14 +243,17 @@ async def conn_client(proxy):
     while True:
         try:
             reader, writer = await asyncio.open_connection(proxy.ctrl_addr, proxy.ctrl_port)
-            proxy.log.info('Connected to %s:%d', proxy.ctrl_addr, proxy.ctrl_port)
+            outage = proxy.policy.connected()
+            proxy.log.info('Connected to %s:%d after %.1f sec (%d reconnects, %.1f sec disconnected in total)', proxy.ctrl_addr, proxy.ctrl_port, outage, proxy.policy.reconnects, proxy.policy.downtime)
             await ctrl_client(proxy, reader, writer)
         except OSError as e:
-            proxy.log.info('%s: %d seconds delayed retrying...', e, proxy.timeout)
-            await asyncio.sleep(proxy.timeout)
+            proxy.log.info('%s', e)
         except asyncio.IncompleteReadError:
             pass
-        proxy.log.info('Reconnecting...')
+        proxy.policy.disconnected()
+        delay = proxy.policy.next_delay()
+        proxy.log.info('Reconnecting in %.2f seconds...', delay)
+        await asyncio.sleep(delay)
 
 
 if __name__ == '__main__':
@@ -220,12 +262,13 @@ if __name__ == '__main__':
     a.add_argument('-d', '--debug', action = 'store_true', help = "Enable debug log")
     a.add_argument('-c', '--config-file', required = True, help = "Path to mandatory config file (in INI format).")
 
-    P = Proxy(log_init('TRAP2CGI', a.parse_args(namespace=Proxy).debug))
+    args = a.parse_args(namespace = Proxy)
+    loop = asyncio.get_event_loop()
+    log = debug_init('TRAP2CGI', args.debug, lambda: loop.call_soon_threadsafe(P.load_config))
 
-    P.log.info('CGI proxy v%s starting with PID %d:', __version__, os.getpid())
-    P.log.info('Destination %s (concurrency %d)', P.location, P.concurrency)
+    log.info('CGI proxy v%s starting with PID %d:', __version__, os.getpid())
+    P = Proxy(log)
     P.log.info('Connecting to TRAP source %s:%d...', P.ctrl_addr, P.ctrl_port)
 
-    loop = asyncio.get_event_loop()
     loop.run_until_complete(conn_client(P))
     # FIXME: use loop.run() function instead when available (Python 3.7+).
@@ -19,9 +19,16 @@ import shutil
 import time
 import sys, shutil, stat
 import tempfile
+import io
+import contextlib
+import traceback
+import multiprocessing
+import collections
+import queue
 
 import osmopy.obscvty as obscvty
 import osmopy.osmoutil as osmoutil
+from osmopy.osmo_interact.common import allocate_ports
 
 
 # Run all tests for a given config, raise error on failure
@@ -37,6 +44,21 @@ def test_config(app_desc, config, tmpdir, verbose=True):
         raise RuntimeError(f"{config}: token_vty_command() failed")
 
 
+# Like test_config(), but run all checks in one VTY session of a single
+# application instance; launch it again only if writing changed the config
+def test_config_single_launch(app_desc, config, tmpdir, verbose=True):
+    newconfig = copy_config(tmpdir, config)
+    loaded = config_lines(newconfig)
+    failed = test_config_atest(app_desc, newconfig, all_checks, verbose)
+    if failed:
+        raise RuntimeError(f"{config}: {', '.join(failed)} failed")
+
+    if config_lines(newconfig) == loaded:
+        return
+    if test_config_atest(app_desc, newconfig, token_vty_command, verbose) > 0:
+        raise RuntimeError(f"{config}: token_vty_command() failed")
+
+
 def test_config_atest(app_desc, config, run_test, verbose=True):
     proc = None
     ret = None
@@ -46,9 +68,9 @@ def test_config_atest(app_desc, config, run_test, verbose=True):
         if verbose:
             print("Verifying %s, test %s" % (' '.join(cmd), run_test.__name__))
 
-        proc = osmoutil.popen_devnull(cmd)
-        end = app_desc[2]
         port = app_desc[0]
+        proc = osmoutil.popen_devnull(cmd, port=port)
+        end = app_desc[2]
         vty = obscvty.VTYInteract(end, "127.0.0.1", port)
         ret = run_test(vty)
 
@@ -71,7 +93,7 @@ def copy_config(dirname, config):
     if os.path.exists(dirname):
         shutil.rmtree(dirname)
 
-    os.mkdir(dirname)
+    os.makedirs(dirname)
 
     prefix = os.path.basename(config)
     tmpfile = tempfile.NamedTemporaryFile(
@@ -82,6 +104,49 @@ def copy_config(dirname, config):
     return tmpfile.name
 
 
+# Config lines that matter: without comments, blank lines and trailing
+# whitespace; indentation is kept as it defines the node structure
+def config_lines(config):
+    with open(config) as f:
+        return [l.rstrip() for l in f if l.strip() and not l.strip().startswith('!')]
+
+
+# Run verify_doc, write_config and token_vty_command, return names of the failed ones
+def all_checks(vty):
+    failed = []
+    if verify_doc(vty)[0] > 0:
+        failed.append("verify_doc()")
+    if write_config(vty) > 0:
+        failed.append("write_config()")
+    if token_vty_command(vty) > 0:
+        failed.append("token_vty_command()")
+    return failed
+
+
+# Make the VTY (and the CTRL interface, if configured) bind to the given
+# ports on localhost: every 'line vty' and 'ctrl' node gets its own bind line
+def rewrite_ports(content, vty_port, ctrl_port):
+    binds = {'line vty': vty_port, 'ctrl': ctrl_port}
+    lines = []
+    node = None
+    for line in content.splitlines():
+        if line.strip().startswith('!'):
+            lines.append(line)
+            continue
+        if line and not line[0].isspace():
+            node = line.strip()
+            lines.append(line)
+            if node in binds:
+                lines.append(' bind 127.0.0.1 %d' % binds[node])
+            continue
+        if node in binds and line.split()[:1] == ['bind']:
+            continue
+        lines.append(line)
+    if 'line vty' not in [l.strip() for l in lines]:
+        lines += ['line vty', ' bind 127.0.0.1 %d' % vty_port]
+    return '\n'.join(lines) + '\n'
+
+
 def write_config(vty):
     new_config = vty.enabled_command("write")
     if not new_config.startswith("Configuration saved to "):
@@ -139,9 +204,101 @@ def check_configs_tested(basedir, app_configs, ignore_configs):
             print("Warning: %s is not being tested" % config, file=sys.stderr)
 
 
+# (vty port, ctrl port) of a test_configs_parallel() worker process
+_ports = None
+
+def _worker_init(ports):
+    global _ports
+    _ports = (ports.get(), ports.get())
+
+
+def _test_config_task(task):
+    (app, config, tmpdir, verbose, single_launch) = task
+    (vty_port, ctrl_port) = _ports
+    output = io.StringIO()
+    passed = True
+    with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+        try:
+            if os.path.exists(tmpdir): # left behind by an interrupted run
+                shutil.rmtree(tmpdir)
+            os.makedirs(tmpdir)
+            rewritten = os.path.join(tmpdir, os.path.basename(config))
+            with open(config) as f:
+                content = rewrite_ports(f.read(), vty_port, ctrl_port)
+            with open(rewritten, 'w') as f:
+                f.write(content)
+            app = (vty_port,) + tuple(app[1:])
+            written = os.path.join(tmpdir, 'written')
+            if single_launch:
+                test_config_single_launch(app, rewritten, written, verbose)
+            else:
+                test_config(app, rewritten, written, verbose)
+        except Exception:
+            traceback.print_exc()
+            passed = False
+    return config, passed, output.getvalue()
+
+
+# Test configs in a pool of jobs processes, each with its own VTY and CTRL
+# port: configs are rewritten to use them. Ports which can't be rewritten
+# (CTRL without a 'ctrl' node, fixed ports of some apps) would collide, so
+# configs of the same app are never tested at the same time. Output is
+# printed per config, returns the number of configs which failed
+def test_configs_parallel(tasks, jobs, port_base, verbose=True):
+    ports = multiprocessing.Queue()
+    for port in allocate_ports(port_base, 2 * jobs):
+        ports.put(port)
+    per_app = collections.OrderedDict()
+    for task in tasks:
+        per_app.setdefault(task[0][1], collections.deque()).append(task)
+    done = queue.Queue()
+    busy = set()
+    failed = []
+    with multiprocessing.Pool(jobs, _worker_init, (ports,)) as pool:
+        while per_app or busy:
+            for (app, pending) in list(per_app.items()):
+                if len(busy) >= jobs:
+                    break
+                if app in busy:
+                    continue
+                task = pending.popleft()
+                if not pending:
+                    del per_app[app]
+                busy.add(app)
+                pool.apply_async(_test_config_task, (task,),
+                                 callback=lambda r, app=app: done.put((app, r)),
+                                 error_callback=lambda e, app=app, config=task[1]: done.put((app, (config, False, repr(e)))))
+            (app, (config, passed, output)) = done.get()
+            busy.discard(app)
+            print("%s: %s" % ('pass' if passed else 'FAIL', config))
+            if output and (not passed or verbose):
+                print(output.rstrip('\n'))
+                print()
+            if not passed:
+                failed.append(config)
+    if failed:
+        print("Failed configs:\n%s" % '\n'.join(failed), file=sys.stderr)
+    return len(failed)
+
+
 def test_all_apps(apps, app_configs, tmpdir="writtenconfig", verbose=True,
-                  confpath=".", ignore_configs=[]):
+                  confpath=".", ignore_configs=[], single_launch=False,
+                  jobs=1, port_base=42000):
     check_configs_tested("doc/examples/", app_configs, ignore_configs)
+    if jobs > 1:
+        tasks = []
+        for app in apps:
+            if not app_exists(app):
+                print("Skipping app %s (not found)" % app[1], file=sys.stderr)
+                continue
+            for config in app_configs[app[3]]:
+                config = os.path.join(confpath, config)
+                tasks.append((app, config, os.path.join(tmpdir, str(len(tasks))), verbose, single_launch))
+        failures = test_configs_parallel(tasks, jobs, port_base, verbose) if tasks else 0
+        if os.path.exists(tmpdir):
+            shutil.rmtree(tmpdir)
+        return failures
+
     for app in apps:
         if not app_exists(app):
             print("Skipping app %s (not found)" % app[1], file=sys.stderr)
@@ -150,7 +307,10 @@ def test_all_apps(apps, app_configs, tmpdir="writtenconfig", verbose=True,
         configs = app_configs[app[3]]
         for config in configs:
             config = os.path.join(confpath, config)
-            test_config(app, config, tmpdir, verbose)
+            if single_launch:
+                test_config_single_launch(app, config, tmpdir, verbose)
+            else:
+                test_config(app, config, tmpdir, verbose)
 
     shutil.rmtree(tmpdir)
 
@@ -169,6 +329,18 @@ if __name__ == '__main__':
                         help="searchpath for config")
     parser.add_argument("-w", "--workdir", dest="w",
                         help="Working directory to run in")
+    parser.add_argument("-s", "--single-launch", dest="single_launch",
+                        action="store_true",
+                        help="Run all checks against one application instance"
+                        " per config, launch it again only to load a config"
+                        " which changed when written")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Test this many configs in parallel; each one is"
+                        " tested on a copy with its 'line vty' and 'ctrl' nodes"
+                        " rewritten to bind to a port of its own; configs of"
+                        " the same app are tested one after another")
+    parser.add_argument("--port-base", type=int, default=42000,
+                        help="First port to use with --jobs")
 
     args = parser.parse_args()
 
@@ -190,4 +362,6 @@ if __name__ == '__main__':
 
     os.chdir(workdir)
     sys.exit(test_all_apps(apps, configs, ignore_configs=ignores,
-                           confpath=confpath, verbose=args.verbose))
+                           confpath=confpath, verbose=args.verbose,
+                           single_launch=args.single_launch,
+                           jobs=args.jobs, port_base=args.port_base))
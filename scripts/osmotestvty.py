@@ -34,15 +34,15 @@ class TestVTY(unittest.TestCase):
             cfi = config_index + 1
             osmo_vty_cmd[cfi] = os.path.join(confpath, osmo_vty_cmd[cfi])
 
+        appstring = osmoappdesc.vty_app[2]
+        appport = osmoappdesc.vty_app[0]
+
         try:
             print("Launch: %s from %s" % (' '.join(osmo_vty_cmd), os.getcwd()))
-            self.proc = osmoutil.popen_devnull(osmo_vty_cmd)
+            self.proc = osmoutil.popen_devnull(osmo_vty_cmd, port=appport)
         except OSError:
             print("Current directory: %s" % os.getcwd(), file=sys.stderr)
             print("Consider setting -b", file=sys.stderr)
-
-        appstring = osmoappdesc.vty_app[2]
-        appport = osmoappdesc.vty_app[0]
         self.vty = obscvty.VTYInteract(appstring, "127.0.0.1", appport)
 
     def tearDown(self):
@@ -18,13 +18,19 @@
  */
 """
 
-__version__ = "0.7.2" # bump this on every non-trivial change
+__version__ = "0.10.3" # bump this on every non-trivial change
 
-import argparse, os, logging
+import argparse, os, logging, re, io, json, hashlib
+from urllib.request import urlopen
+from collections import deque
+from types import SimpleNamespace
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
 from functools import partial
 from distutils.version import StrictVersion as V # FIXME: use NormalizedVersion from PEP-386 when available
-from twisted.internet import defer, reactor
+from twisted.internet import defer, reactor, threads
 from suds.client import Client
+from suds.transport.http import HttpTransport
 from treq import post, collect
 from osmopy.trap_helper import debug_init, get_type, get_r, p_h, make_params, comm_proc
 from osmopy.twisted_ipa import CTRL, IPAFactory, __version__ as twisted_ipa_version
@@ -43,6 +49,224 @@ def handle_reply(p, bid, f, log, r):
     log.info("Received SOAP response for BSC %s with %d commands, error status: %s" % (bsc_id, len(repl.commands), repl.error))
 
 
+class Template(object):
+    """
+    Precompiled SOAP envelope: rendered once by suds with placeholder arguments, filled with escaped values for each request
+    """
+    MARK = '@@soap-arg-%d@@'
+    RE_MARK = re.compile('@@soap-arg-([0-9]+)@@')
+
+    def __init__(self, envelope, nargs):
+        self.envelope = envelope
+        self.nargs = nargs
+        self.parts = self.RE_MARK.split(envelope)
+        # odd elements of split() result are placeholder indexes, each argument must be used exactly once
+        self.index = [int(i) for i in self.parts[1::2]]
+        if sorted(self.index) != list(range(nargs)):
+            raise ValueError("Envelope does not have fixed shape")
+
+    def render(self, *args):
+        """
+        Make envelope for given arguments
+        """
+        parts = list(self.parts)
+        for (n, i) in enumerate(self.index):
+            parts[2 * n + 1] = escape(str(args[i]))
+        return ''.join(parts).encode('utf-8')
+
+
+def compile_op(client, op, nargs, log):
+    """
+    Compile SOAP operation with given number of arguments into Template, None is returned if operation can't be compiled
+    """
+    try:
+        envelope = getattr(client, op)(*[Template.MARK % i for i in range(nargs)]).envelope
+        if isinstance(envelope, bytes):
+            envelope = envelope.decode('utf-8')
+        return Template(envelope, nargs)
+    except Exception as e:
+        log.warning("Unable to compile SOAP operation %s, falling back to SUDS: %s" % (op, e))
+        return None
+
+
+# operations with fixed shape which are compiled into templates: name -> number of arguments
+COMPILED = { 'registerSiteLocation' : 8 }
+
+
+class Prefetched(HttpTransport):
+    """
+    SUDS transport which serves already fetched documents from memory, everything else (imported schemas etc) is fetched as usual
+    """
+    def __init__(self, documents):
+        HttpTransport.__init__(self)
+        self.documents = documents # url -> content
+
+    def open(self, request):
+        if request.url in self.documents:
+            return io.BytesIO(self.documents[request.url])
+        return HttpTransport.open(self, request)
+
+
+def fetch(wsdl):
+    with urlopen(wsdl) as f:
+        return f.read()
+
+
+def make_client(wsdl, location, content=None):
+    """
+    Make async SUDS client, WSDL is not downloaded again if its content is given
+    """
+    if content is None:
+        return Client(wsdl, location=location, nosend=True)
+    return Client(wsdl, location=location, nosend=True, transport=Prefetched({ wsdl : content }))
+
+
+def build_entry(wsdl, location, log, content=None):
+    """
+    Fetch (unless content is given) and compile WSDL: returns (entry, soap) tuple where entry is serializable service description and soap is SUDS client
+    """
+    if content is None:
+        content = fetch(wsdl)
+    digest = hashlib.sha256(content).hexdigest()
+    soap = make_client(wsdl, location, content)
+    entry = { 'wsdl' : wsdl, 'hash' : digest, 'location' : soap.wsdl.services[0].ports[0].location, 'templates' : {} }
+    for (op, nargs) in COMPILED.items():
+        t = compile_op(soap.service, op, nargs, log)
+        if t:
+            entry['templates'][op] = [t.envelope, t.nargs]
+    return entry, soap
+
+
+def refresh_entry(wsdl, location, digest, log):
+    """
+    Check if WSDL content still matches given hash: returns None if it does or (entry, soap) tuple with recompiled WSDL otherwise
+    Blocking, intended to be run in a thread
+    """
+    content = fetch(wsdl)
+    if hashlib.sha256(content).hexdigest() == digest:
+        return None
+    return build_entry(wsdl, location, log, content)
+
+
+class WsdlCache(object):
+    """
+    On-disk cache of compiled WSDL (port location and operation templates) keyed by WSDL URL and validated by WSDL content hash
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def entry_path(self, wsdl):
+        return os.path.join(self.path, hashlib.sha1(wsdl.encode('utf-8')).hexdigest() + '.json')
+
+    def load(self, wsdl):
+        """
+        Return cached entry for given WSDL URL or None
+        """
+        try:
+            with open(self.entry_path(wsdl)) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return entry if entry.get('wsdl') == wsdl else None
+
+    def save(self, entry):
+        os.makedirs(self.path, exist_ok=True)
+        tmp = self.entry_path(entry['wsdl']) + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(entry, f)
+        os.replace(tmp, self.entry_path(entry['wsdl']))
+
+    def clear(self, wsdl):
+        """
+        Explicitly invalidate cached entry for given WSDL URL
+        """
+        try:
+            os.remove(self.entry_path(wsdl))
+        except FileNotFoundError:
+            pass
+
+
+def parse_reply(r):
+    """
+    Stream-parse raw SOAP server reply without building DOM: returns object with commands[] and error attributes, same as SUDS does
+    """
+    repl = SimpleNamespace(commands=[], error=None)
+    for (_, el) in ElementTree.iterparse(io.BytesIO(r)):
+        tag = el.tag.rsplit('}', 1)[-1]
+        if tag == 'commands':
+            repl.commands.append(el.text or '')
+        elif tag == 'error':
+            repl.error = el.text
+        elif tag == 'faultstring':
+            raise Exception("SOAP fault: %s" % el.text)
+        el.clear()
+    return repl
+
+
+class WorkQueue(object):
+    """
+    Bounded work queue for SOAP requests: at most 'limit' requests are in-flight, at most 'depth' (unless None) requests are pending
+    per BSC (the oldest pending request of given BSC is dropped when exceeded), requests are started in order of arrival
+    """
+    def __init__(self, limit, depth, log):
+        self.limit = limit
+        self.depth = depth
+        self.log = log
+        self.order = deque() # [bsc, job] entries in order of arrival, job is None for dropped entries
+        self.per_bsc = {} # bsc -> deque of entries
+        self.pending = 0
+        self.in_flight = 0
+        self.dropped = 0
+
+    def gauges(self):
+        """
+        Log current queue state
+        """
+        self.log.debug("SOAP queue: %d pending, %d in-flight, %d dropped" % (self.pending, self.in_flight, self.dropped))
+
+    def put(self, bsc, f, *args):
+        """
+        Enqueue f(*args) for given BSC: f is expected to return Deferred which fires when request is complete
+        """
+        entry = [bsc, partial(f, *args)]
+        q = self.per_bsc.setdefault(bsc, deque())
+        q.append(entry)
+        self.order.append(entry)
+        self.pending += 1
+        while self.depth is not None and len(q) > self.depth:
+            q.popleft()[1] = None
+            self.pending -= 1
+            self.dropped += 1
+            self.log.info("Dropped outdated request for BSC %s" % bsc)
+        self.run()
+
+    def run(self):
+        """
+        Start as many pending requests as there are free slots
+        """
+        while self.in_flight < self.limit and self.pending:
+            (bsc, job) = self.order.popleft()
+            if job is None:
+                continue
+            q = self.per_bsc[bsc]
+            q.popleft()
+            if not q:
+                del self.per_bsc[bsc]
+            self.pending -= 1
+            self.in_flight += 1
+            d = defer.maybeDeferred(job)
+            d.addBoth(self.done)
+        self.gauges()
+
+    def done(self, r):
+        """
+        Release slot of completed request and start next one
+        """
+        self.in_flight -= 1
+        self.run()
+        return r
+
+
 class Trap(CTRL):
     """
     TRAP handler (agnostic to factory's client object)
@@ -76,21 +300,36 @@ class Trap(CTRL):
         self.factory.log.info("Connected to CTRL@%s:%d" % (self.factory.host, self.factory.port))
         super(CTRL, self).connectionMade()
 
-    @defer.inlineCallbacks
     def handle_locationstate(self, net, bsc, bts, trx, data):
         """
-        Handle location-state TRAP: parse trap content, build SOAP context and use treq's routines to post it while setting up async handlers
+        Handle location-state TRAP: parse trap content and enqueue SOAP request, the request is only fired once its slot is granted
         """
         params = make_params(bsc, data)
         self.factory.log.info('location-state@%s.%s.%s.%s (%s) => %s' % (net, bsc, bts, trx, params['time_stamp'], data))
-        ctx = self.factory.client.registerSiteLocation(bsc, float(params['lon']), float(params['lat']), params['position_validity'], params['time_stamp'], params['oper_status'], params['admin_status'], params['policy_status'])
-        d = post(self.factory.location, ctx.envelope)
-        d.addCallback(collect, partial(handle_reply, ctx.process_reply, params['bsc_id'], self.transport.write, self.factory.log)) # treq's collect helper is handy to get all reply content at once using closure on ctx
-        d.addErrback(lambda e, bsc: self.factory.log.critical("HTTP POST error %s while trying to register BSC %s on %s" % (repr(e), bsc, self.factory.location)), bsc) # handle HTTP errors
-        # Ensure that we run only limited number of requests in parallel:
-        yield self.factory.semaphore.acquire()
-        yield d # we end up here only if semaphore is available which means it's ok to fire the request without exceeding the limit
-        self.factory.semaphore.release()
+        self.factory.queue.put(bsc, self.register_location, params)
+
+    def register_location(self, params):
+        """
+        Build SOAP context and use treq's routines to post it while setting up async handlers
+        """
+        args = (params['bsc_id'], float(params['lon']), float(params['lat']), params['position_validity'], params['time_stamp'], params['oper_status'], params['admin_status'], params['policy_status'])
+        tmpl = self.factory.templates.get('registerSiteLocation')
+        if tmpl:
+            return self.send_envelope(tmpl.render(*args), parse_reply, params)
+        d = self.factory.get_client()
+        d.addCallback(lambda client: client.registerSiteLocation(*args))
+        d.addCallback(lambda ctx: self.send_envelope(ctx.envelope, ctx.process_reply, params))
+        d.addErrback(lambda e, bsc: self.factory.log.critical("SUDS error %s while trying to register BSC %s" % (repr(e), bsc)), params['bsc_id'])
+        return d
+
+    def send_envelope(self, envelope, process_reply, params):
+        """
+        POST SOAP envelope and set up async handlers for the reply
+        """
+        d = post(self.factory.location, envelope)
+        d.addCallback(collect, partial(handle_reply, process_reply, params['bsc_id'], self.write, self.factory.log)) # treq's collect helper is handy to get all reply content at once using closure on ctx
+        d.addErrback(lambda e, bsc: self.factory.log.critical("HTTP POST error %s while trying to register BSC %s on %s" % (repr(e), bsc, self.factory.location)), params['bsc_id']) # handle HTTP errors
+        return d
 
     def handle_notificationrejectionv1(self, net, bsc, bts, trx, data):
         """
@@ -105,23 +344,77 @@ class TrapFactory(IPAFactory):
     """
     location = None
     log = None
-    semaphore = None
+    queue = None
     client = None
+    templates = None
     host = None
     port = None
-    def __init__(self, host, port, proto, semaphore, log, wsdl=None, location=None):
+    def __init__(self, host, port, proto, queue, log, wsdl=None, location=None, compiled=True, cache=None):
         self.host = host # for logging only,
         self.port = port # seems to be no way to get it from ReconnectingClientFactory
         self.log = log
-        self.semaphore = semaphore
-        soap = Client(wsdl, location=location, nosend=True) # make async SOAP client
-        self.location = location.encode() if location else soap.wsdl.services[0].ports[0].location # necessary for dispatching HTTP POST via treq
-        self.client = soap.service
+        self.queue = queue
+        self.wsdl = wsdl
+        self.override = location
+        self.cache = cache if compiled else None
+        self.templates = {}
+        entry = self.cache.load(wsdl) if self.cache else None
+        if entry:
+            self.log.info("Using cached WSDL %s (%s)" % (wsdl, entry['hash']))
+            self.use(entry)
+            reactor.callWhenRunning(self.refresh)
+        else:
+            (entry, soap) = build_entry(wsdl, location, self.log)
+            self.use(entry if compiled else dict(entry, templates={}), soap)
+            if self.cache:
+                self.cache.save(entry)
         level = self.log.getEffectiveLevel()
         self.log.setLevel(logging.WARNING) # we do not need excessive debug from lower levels
         super(TrapFactory, self).__init__(proto, self.log)
         self.log.setLevel(level)
-        self.log.debug("Using IPA %s, SUDS client: %s" % (Ctrl.version, soap))
+        self.log.debug("Using IPA %s, compiled SOAP operations: %s" % (Ctrl.version, ', '.join(self.templates.keys())))
+
+    def use(self, entry, soap=None):
+        """
+        Switch to given compiled WSDL entry and (optional) SUDS client
+        """
+        self.entry = entry
+        self.location = self.override.encode() if self.override else entry['location'] # necessary for dispatching HTTP POST via treq
+        self.templates = dict((op, Template(*t)) for (op, t) in entry['templates'].items())
+        self.client = soap.service if soap else None
+
+    def get_client(self):
+        """
+        Return Deferred firing with SUDS service for operations which are not compiled,
+        SUDS client is created in a thread on first use so WSDL download does not block the reactor
+        """
+        if self.client is not None:
+            return defer.succeed(self.client)
+        d = threads.deferToThread(make_client, self.wsdl, self.override)
+        d.addCallback(self.got_client)
+        return d
+
+    def got_client(self, soap):
+        if self.client is None: # another request might have been faster
+            self.client = soap.service
+        return self.client
+
+    def refresh(self):
+        """
+        Check freshness of cached WSDL in background, recompile and update the cache if it has changed
+        """
+        d = threads.deferToThread(refresh_entry, self.wsdl, self.override, self.entry['hash'], self.log)
+        d.addCallback(self.refreshed)
+        d.addErrback(lambda e: self.log.warning("Unable to check WSDL %s freshness: %s" % (self.wsdl, e.getErrorMessage())))
+
+    def refreshed(self, res):
+        if res is None:
+            self.log.debug("Cached WSDL %s is up to date" % self.wsdl)
+            return
+        (entry, soap) = res
+        self.log.info("WSDL %s has changed (%s), cache updated" % (self.wsdl, entry['hash']))
+        self.use(entry, soap)
+        self.cache.save(entry)
 
 
 if __name__ == '__main__':
@@ -131,12 +424,27 @@ if __name__ == '__main__':
     p.add_argument('-c', '--ctrl', default='localhost', help="Adress to use for CTRL interface, defaults to localhost")
     p.add_argument('-w', '--wsdl', required=True, help="WSDL URL for SOAP")
     p.add_argument('-n', '--num', type=int, default=5, help="Max number of concurrent HTTP requests to SOAP server")
+    p.add_argument('-q', '--queue-depth', type=int, default=1, help="Max number of pending requests per BSC, oldest are dropped, unlimited by default")
+    p.add_argument('--ping-interval', type=float, help="Send IPA CCM PING to CTRL server every given number of seconds")
+    p.add_argument('--pong-timeout', type=float, help="Reconnect to CTRL server if PONG is not received within given number of seconds")
     p.add_argument('-d', '--debug', action='store_true', help="Enable debug log") # keep in sync with debug_init call below
+    p.add_argument('-s', '--suds', action='store_true', help="Build every SOAP request with SUDS instead of precompiled templates")
+    p.add_argument('--cache-dir', default=os.path.join(os.path.expanduser('~'), '.cache', 'osmo-soap'), help="Directory for compiled WSDL cache")
+    p.add_argument('--no-cache', action='store_true', help="Always fetch and compile WSDL on startup")
+    p.add_argument('--clear-cache', action='store_true', help="Invalidate cached WSDL compilation before startup")
     p.add_argument('-l', '--location', help="Override location found in WSDL file (don't use unless you know what you're doing)")
     args = p.parse_args()
+    if args.queue_depth is not None and args.queue_depth < 1:
+        p.error("queue depth must be at least 1")
 
     log = debug_init('CTRL2SOAP', args.debug)
 
     log.info("SOAP proxy %s starting with PID %d ..." % (__version__, os.getpid()))
-    reactor.connectTCP(args.ctrl, args.port, TrapFactory(args.ctrl, args.port, Trap, defer.DeferredSemaphore(args.num), log, args.wsdl, args.location))
+    cache = None if args.no_cache else WsdlCache(args.cache_dir)
+    if cache and args.clear_cache:
+        cache.clear(args.wsdl)
+    T = TrapFactory(args.ctrl, args.port, Trap, WorkQueue(args.num, args.queue_depth, log), log, args.wsdl, args.location, not args.suds, cache)
+    T.ping_interval = args.ping_interval
+    T.pong_timeout = args.pong_timeout
+    reactor.connectTCP(args.ctrl, args.port, T)
     reactor.run()
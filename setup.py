@@ -26,6 +26,8 @@ scripts = [
     "scripts/osmo_ctrl.py",
     "scripts/osmo_rate_ctr2csv.py",
     "scripts/osmo_trap2cgi.py",
+    "scripts/osmo_ipa_sim.py",
+    "scripts/osmo_ctrl_mux.py",
     "scripts/osmo_interact_vty.py",
     "scripts/osmo_interact_ctrl.py",
     "scripts/osmo_verify_transcript_vty.py",
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+# benchmark for reading multi-megabyte VTY outputs with osmopy.obscvty
+
+import sys, os, time, argparse, socket, threading
+
+# make osmopy importable from the source tree without installation
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from osmopy.obscvty import VTYInteract
+
+def serve(sock, output, count):
+    """
+    Fake VTY: echo every request followed by output and the prompt, sent in 4096 byte chunks
+    """
+    for i in range(count):
+        request = sock.recv(4096).decode().rstrip('\r')
+        reply = ('%s\r\n%sOsmoBench# ' % (request, output)).encode()
+        for j in range(0, len(reply), 4096):
+            sock.sendall(reply[j:j + 4096])
+
+def legacy_command(vty, request, ends):
+    """
+    Reading the reply as it was done before: string concatenation and prompt search over everything received so far
+    """
+    vty.socket.send(("%s\r" % request).encode())
+    res = ""
+    while True:
+        data = vty.socket.recv(4096).decode()
+        res = "%s%s" % (res, data)
+        if not res:
+            raise IOError("Failed to read data (did the app crash?)")
+        end = vty._is_end(res, ends)
+        if end > 0:
+            break
+    return res[len(request) + 2: end * -1]
+
+def run(f, vty, output, count):
+    (a, b) = socket.socketpair()
+    vty.socket = a
+    t = threading.Thread(target=serve, args=(b, output, count))
+    t.start()
+    start = time.perf_counter()
+    for i in range(count):
+        res = f('show running-config')
+    took = (time.perf_counter() - start) / count
+    t.join()
+    a.close()
+    b.close()
+    assert res == output[:-2] # last \r\n belongs to the prompt
+    return took
+
+if __name__ == '__main__':
+    a = argparse.ArgumentParser(description='Measure time to read large VTY outputs with obscvty.')
+    a.add_argument('-s', '--size', type=float, default=4, help="Output size in megabytes, defaults to 4")
+    a.add_argument('-n', '--num', type=int, default=3, help="Number of commands to run")
+    args = a.parse_args()
+
+    line = ' description some line of show running-config output\r\n'
+    output = line * int(args.size * 1024 * 1024 / len(line))
+    vty = VTYInteract('OsmoBench', 'localhost', 0)
+    ends = [vty.norm_end, vty.priv_end]
+
+    legacy = run(lambda r: legacy_command(vty, r, ends), vty, output, args.num)
+    tail = run(vty.command, vty, output, args.num)
+    print('legacy:    %.1f ms/command for %.1f MB' % (legacy * 1000, len(output) / 1024.0 / 1024))
+    print('tail scan: %.1f ms/command (%.1fx)' % (tail * 1000, legacy / tail))
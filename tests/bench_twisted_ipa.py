@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+
+# microbenchmark for per-frame dispatch cost of osmopy.twisted_ipa
+
+import sys, os, time, argparse
+
+# make osmopy importable from the source tree without installation
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from osmopy.osmo_ipa import Ctrl, IPA
+from osmopy.twisted_ipa import CTRL
+
+class BenchCtrl(CTRL):
+    """
+    CTRL handler which only counts received TRAPs
+    """
+    count = 0
+
+    def ctrl_TRAP(self, data, op_id, v):
+        self.count += 1
+
+def legacy_dispatch(proto, data):
+    """
+    Per-frame dispatch as it was done before dispatch tables: new IPA() objects, reverse lookup via list index and getattr()
+    """
+    (_, p, extension, content) = IPA().del_header(data)
+    d = IPA.PROTO
+    name = list(d.keys())[list(d.values()).index(p)]
+    method = getattr(proto, 'handle_' + name)
+    e = IPA.EXT
+    ext = list(e.keys())[list(e.values()).index(extension)]
+    (cmd, op_id, v) = content.decode('utf-8').split(' ', 2)
+    getattr(proto, 'ctrl_' + cmd)(content, op_id, v)
+    return method, ext
+
+def run(f, frames):
+    start = time.perf_counter()
+    for frame in frames:
+        f(frame)
+    return (time.perf_counter() - start) / len(frames) * 1e6
+
+if __name__ == '__main__':
+    a = argparse.ArgumentParser(description='Measure per-frame dispatch cost of twisted_ipa.')
+    a.add_argument('-n', '--num', type=int, default=200000, help="Number of TRAP frames to dispatch")
+    args = a.parse_args()
+
+    frames = [Ctrl().trap('net.0.bsc.%d.bts.0.location-state' % i, 'x,y') for i in range(args.num)]
+    proto = BenchCtrl()
+
+    legacy = run(lambda f: legacy_dispatch(proto, f), frames)
+    table = run(proto.process_chunk, frames)
+    print('legacy dispatch: %.3f usec/frame' % legacy)
+    print('table dispatch:  %.3f usec/frame (%.1fx)' % (table, legacy / table))
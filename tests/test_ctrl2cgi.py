@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+
+# unit tests for the adjustable request limit of scripts/ctrl2cgi.py
+
+import os, sys, unittest
+
+root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, root)
+sys.path.insert(0, os.path.join(root, 'scripts'))
+try:
+    from ctrl2cgi import ResizableSemaphore
+except ImportError as e:
+    raise unittest.SkipTest('ctrl2cgi.py dependencies are not available: %s' % e)
+
+class ResizableSemaphoreTest(unittest.TestCase):
+    def setUp(self):
+        self.sem = ResizableSemaphore(5)
+        self.acquired = []
+        for _ in range(4):
+            self.acquire()
+
+    def acquire(self):
+        self.sem.acquire().addCallback(self.acquired.append)
+
+    def test_shrink_in_flight(self):
+        self.sem.set_limit(2)
+        self.assertEqual(self.sem.tokens, 0)
+        self.acquire() # must wait, not fail
+        self.assertEqual(len(self.acquired), 4)
+        self.sem.release()
+        self.sem.release()
+        self.assertEqual(len(self.acquired), 4) # 2 requests are still in-flight
+        self.sem.release()
+        self.assertEqual(len(self.acquired), 5)
+        self.sem.release()
+        self.sem.release()
+        self.assertEqual(self.sem.tokens, 2)
+
+    def test_grow(self):
+        self.acquire()
+        self.acquire()
+        self.assertEqual(len(self.acquired), 5)
+        self.sem.set_limit(7)
+        self.assertEqual(len(self.acquired), 6)
+        self.assertEqual(self.sem.tokens, 1)
+
+    def test_shrink_then_grow(self):
+        self.sem.set_limit(2)
+        self.sem.set_limit(3)
+        self.acquire()
+        self.assertEqual(len(self.acquired), 4)
+        self.sem.release()
+        self.acquire()
+        self.assertEqual(len(self.acquired), 4)
+        self.sem.release()
+        self.assertEqual(len(self.acquired), 5)
+
+if __name__ == '__main__':
+    unittest.main()
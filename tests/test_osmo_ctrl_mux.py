@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+# unit tests for request routing and GET caching of scripts/osmo_ctrl_mux.py
+
+import logging, os, sys, unittest
+
+root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, root)
+sys.path.insert(0, os.path.join(root, 'scripts'))
+from osmo_ctrl_mux import Mux
+from osmopy.osmo_ipa import Ctrl, IPA
+
+class FakeWriter(object):
+    """
+    Stand-in for asyncio.StreamWriter collecting CTRL messages written to it
+    """
+    class transport(object):
+        @staticmethod
+        def get_write_buffer_size():
+            return 0
+
+    def __init__(self):
+        self.messages = []
+
+    def write(self, data):
+        self.messages.append(IPA().del_header(data)[3].decode('utf-8'))
+
+    def close(self):
+        pass
+
+    def get_extra_info(self, name):
+        return None
+
+class MuxTest(unittest.TestCase):
+    def setUp(self):
+        self.mux = Mux(logging.getLogger('test'), 1024, [('cached.*', 60)])
+        self.mux.upstream = FakeWriter()
+        self.a = FakeWriter()
+        self.b = FakeWriter()
+        self.mux.clients.update([self.a, self.b])
+
+    def client(self, w, msg):
+        self.mux.from_client(w, None, IPA.PROTO['OSMO'], IPA.EXT['CTRL'], msg.encode('utf-8'))
+
+    def upstream(self, msg):
+        self.mux.from_upstream(Ctrl().add_header(msg), IPA.PROTO['OSMO'], IPA.EXT['CTRL'], msg.encode('utf-8'))
+
+    def test_coalesce_and_cache(self):
+        self.client(self.a, 'GET 7 cached.x')
+        self.client(self.b, 'GET 8 cached.x')
+        self.assertEqual(self.mux.upstream.messages, ['GET 1 cached.x'])
+        self.upstream('GET_REPLY 1 cached.x 42')
+        self.assertEqual(self.a.messages, ['GET_REPLY 7 cached.x 42'])
+        self.assertEqual(self.b.messages, ['GET_REPLY 8 cached.x 42'])
+        self.client(self.a, 'GET 9 cached.x')
+        self.assertEqual(self.a.messages[-1], 'GET_REPLY 9 cached.x 42')
+        self.assertEqual(len(self.mux.upstream.messages), 1)
+        self.assertEqual(self.mux.stats, dict(hit=1, miss=1, coalesced=1))
+
+    def test_not_cached_without_ttl(self):
+        self.client(self.a, 'GET 1 other')
+        self.upstream('GET_REPLY 1 other 1')
+        self.client(self.a, 'GET 2 other')
+        self.assertEqual(len(self.mux.upstream.messages), 2)
+
+    def test_set_invalidates(self):
+        self.client(self.a, 'GET 1 cached.x')
+        self.upstream('GET_REPLY 1 cached.x 1')
+        self.client(self.b, 'SET 2 cached.x 2')
+        self.client(self.a, 'GET 3 cached.x')
+        self.assertEqual(self.mux.upstream.messages[-1], 'GET 3 cached.x')
+
+    def test_set_while_get_in_flight(self):
+        self.client(self.a, 'GET 1 cached.x')
+        self.client(self.b, 'SET 2 cached.x 2')
+        self.upstream('GET_REPLY 1 cached.x 1')
+        self.assertNotIn('cached.x', self.mux.cache)
+
+    def test_client_lost(self):
+        self.client(self.a, 'GET 1 cached.x')
+        self.client(self.a, 'SET 2 other 1')
+        self.client(self.b, 'GET 3 cached.x')
+        self.mux.client_lost(self.a)
+        self.assertEqual(list(self.mux.pending.values()), [('cached.x', [(self.b, '3')])])
+        self.mux.client_lost(self.b)
+        self.assertEqual(self.mux.pending, {})
+        self.assertEqual(self.mux.inflight, {})
+
+    def test_default_rules_not_shared(self):
+        m1 = Mux(logging.getLogger('test'), 1024)
+        m1.ttl_rules.append(('x', 1))
+        self.assertEqual(Mux(logging.getLogger('test'), 1024).ttl_rules, [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+
+# unit tests for the transcript verification helpers of osmopy.osmo_interact
+
+import collections, os, selectors, shutil, socket, sys, tempfile, time, unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from osmopy.osmo_interact.common import (PORT_PLACEHOLDER, FRESH_INSTANCE_MARK, CACHED, Interact, substitute_port,
+                                         allocate_ports, verify_transcripts, verify_parallel, ResultCache)
+from osmopy.osmo_interact.vty import InteractVty
+from osmopy.osmo_interact.ctrl import InteractCtrl
+from osmopy.osmo_ipa import Ctrl
+from osmopy import osmoutil
+
+class SubstitutePortTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.binary = os.path.join(self.tmpdir, 'osmo-fake')
+        with open(self.binary, 'wb') as f:
+            f.write(b'\x7fELF\xd0\xff' + PORT_PLACEHOLDER.encode())
+        self.config = os.path.join(self.tmpdir, 'fake.cfg')
+        with open(self.config, 'w') as f:
+            f.write('line vty\n bind 127.0.0.1 %s\n' % PORT_PLACEHOLDER)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_binary_and_config(self):
+        (cmd, found) = substitute_port('%s -c %s -l hlr-%s.db' % (self.binary, self.config, PORT_PLACEHOLDER),
+                                       4242, self.tmpdir)
+        self.assertTrue(found)
+        args = cmd.split(' ')
+        self.assertEqual(args[0], self.binary) # binary is neither read nor replaced
+        self.assertNotEqual(args[2], self.config)
+        with open(args[2]) as f:
+            self.assertEqual(f.read(), 'line vty\n bind 127.0.0.1 4242\n')
+        self.assertEqual(args[4], 'hlr-4242.db')
+
+    def test_no_placeholder(self):
+        with open(self.config, 'w') as f:
+            f.write('line vty\n')
+        (cmd, found) = substitute_port('%s -c %s' % (self.binary, self.config), 4242, self.tmpdir)
+        self.assertFalse(found)
+        self.assertEqual(cmd, '%s -c %s' % (self.binary, self.config))
+
+class AllocatePortsTest(unittest.TestCase):
+    def test_skips_ports_in_use(self):
+        busy = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        busy.bind(('127.0.0.1', 0))
+        busy.listen(1)
+        first = busy.getsockname()[1]
+        try:
+            ports = allocate_ports(first, 3)
+        finally:
+            busy.close()
+        self.assertEqual(len(ports), 3)
+        self.assertNotIn(first, ports)
+        self.assertEqual(ports, sorted(set(ports)))
+
+# fake application: tells every client its PID
+FAKE_APP = """
+import os, socket, sys
+s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+s.bind(('127.0.0.1', int(sys.argv[1])))
+s.listen(5)
+while True:
+    (c, _) = s.accept()
+    c.sendall(str(os.getpid()).encode())
+    c.close()
+"""
+
+class PidInteract(Interact):
+    '''
+    Instead of verifying a transcript, record which application instance served it.
+    '''
+    def __init__(self, port):
+        super().__init__(None, port, '127.0.0.1')
+        self.served = {}
+
+    def verify_transcript_file(self, transcript_file):
+        open(transcript_file).close()
+        self.served[os.path.basename(transcript_file)] = self.recv(time.monotonic() + 5)
+
+class SharedInstanceTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        app = os.path.join(self.tmpdir, 'fake_app.py')
+        with open(app, 'w') as f:
+            f.write(FAKE_APP)
+        self.transcripts = []
+        for (name, first_line) in (('a', ''), ('b', ''), ('c', FRESH_INSTANCE_MARK), ('d', '')):
+            self.transcripts.append(os.path.join(self.tmpdir, name))
+            with open(self.transcripts[-1], 'w') as f:
+                f.write('# %s\n' % first_line)
+        self.interact = PidInteract(allocate_ports(20000, 1)[0])
+        self.run_app_str = '%s %s %d' % (sys.executable, app, self.interact.port)
+        self.parallel_app_str = '%s %s %s' % (sys.executable, app, PORT_PLACEHOLDER)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_shared(self):
+        results = verify_transcripts(self.run_app_str, self.transcripts, self.interact, False, shared=True)
+        self.assertEqual(results, [(True, t) for t in self.transcripts])
+        served = self.interact.served
+        self.assertEqual(served['a'], served['b'])
+        self.assertNotEqual(served['b'], served['c']) # restarted for the transcript needing a fresh instance
+        self.assertEqual(served['c'], served['d'])
+
+    def test_cache_missing_transcript(self):
+        missing = os.path.join(self.tmpdir, 'missing')
+        cache = ResultCache(os.path.join(self.tmpdir, 'cache'))
+        results = verify_transcripts(self.run_app_str, self.transcripts + [missing], self.interact, False,
+                                     shared=True, cache=cache)
+        self.assertEqual(results, [(True, t) for t in self.transcripts] + [(False, missing)])
+        results = verify_transcripts(self.run_app_str, self.transcripts + [missing], self.interact, False,
+                                     shared=True, cache=cache)
+        self.assertEqual(results, [(CACHED, t) for t in self.transcripts] + [(False, missing)])
+
+    def test_not_shared(self):
+        verify_transcripts(self.run_app_str, self.transcripts, self.interact, False)
+        self.assertEqual(len(set(self.interact.served.values())), len(self.transcripts))
+
+    def test_parallel_shutdown_times(self):
+        del osmoutil.termination_times[:]
+        results = verify_parallel(self.parallel_app_str, self.transcripts, self.interact, False, 2)
+        self.assertEqual(results, [(True, t) for t in self.transcripts])
+        # recorded in the workers, one per application instance
+        self.assertEqual(len(osmoutil.termination_times), len(self.transcripts))
+
+class ResultCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.files = {}
+        for name in ('osmo-fake', 'fake.cfg', 'fake.db', 'test.vty'):
+            self.files[name] = os.path.join(self.tmpdir, name)
+            self.write(name, name)
+        os.chmod(self.files['osmo-fake'], 0o755)
+        self.run_app_str = '%s -c %s -l %s' % (self.files['osmo-fake'], self.files['fake.cfg'], self.files['fake.db'])
+        self.interact = InteractVty('Fake', 4242, 'localhost', False, False)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, name, content):
+        with open(self.files[name], 'w') as f:
+            f.write(content)
+
+    def key(self):
+        # new instance every time: app_digest() is memoized per instance
+        return ResultCache(os.path.join(self.tmpdir, 'cache')).key(self.run_app_str, self.interact, self.files['test.vty'])
+
+    def test_record(self):
+        cache = ResultCache(os.path.join(self.tmpdir, 'cache'))
+        key = cache.key(self.run_app_str, self.interact, self.files['test.vty'])
+        self.assertFalse(cache.passed(key))
+        cache.record(key)
+        self.assertTrue(cache.passed(key))
+        cache.clear()
+        self.assertFalse(cache.passed(key))
+
+    def test_database_not_in_key(self):
+        key = self.key()
+        self.write('fake.db', 'written by the application')
+        self.assertEqual(key, self.key())
+
+    def test_config_in_key(self):
+        key = self.key()
+        self.write('fake.cfg', 'changed')
+        self.assertNotEqual(key, self.key())
+
+    def test_transcript_in_key(self):
+        key = self.key()
+        self.write('test.vty', 'changed')
+        self.assertNotEqual(key, self.key())
+
+    def test_binary_in_key(self):
+        key = self.key()
+        os.utime(self.files['osmo-fake'], (0, 0))
+        self.assertNotEqual(key, self.key())
+
+class InteractCtrlTest(unittest.TestCase):
+    def setUp(self):
+        self.ctrl = InteractCtrl(4249, 'localhost')
+        (self.ctrl.socket, self.peer) = socket.socketpair()
+        self.ctrl.selector = selectors.DefaultSelector()
+        self.ctrl.selector.register(self.ctrl.socket, selectors.EVENT_READ)
+        self.ctrl.rx_buf = bytearray()
+        self.ctrl.traps = collections.deque(maxlen=self.ctrl.max_traps)
+
+    def tearDown(self):
+        self.ctrl.close()
+        self.peer.close()
+
+    def test_reply_after_traps(self):
+        data = b''.join(Ctrl().add_header(m) for m in
+                        ['TRAP 0 a 1', 'GET_REPLY 99 stale x', 'TRAP 0 b 2', 'GET_REPLY 5 var ' + 'x' * 10000])
+        self.peer.sendall(data)
+        self.assertEqual(self.ctrl.receive('5', timeout=1), ['GET_REPLY 5 var ' + 'x' * 10000])
+        self.assertEqual(self.ctrl.pop_traps(), ['TRAP 0 a 1', 'TRAP 0 b 2'])
+        self.assertEqual(self.ctrl.pop_traps(), [])
+
+    def test_trap_queue_bounded(self):
+        self.peer.sendall(b''.join(Ctrl().add_header('TRAP 0 v %d' % i) for i in range(self.ctrl.max_traps + 10))
+                          + Ctrl().add_header('SET_REPLY 1 v ok'))
+        self.ctrl.receive('1', timeout=1)
+        traps = self.ctrl.pop_traps()
+        self.assertEqual(len(traps), self.ctrl.max_traps)
+        self.assertEqual(traps[-1], 'TRAP 0 v %d' % (self.ctrl.max_traps + 9))
+
+    def test_error_matched_by_id(self):
+        self.peer.sendall(Ctrl().add_header('ERROR 4 stale error') + Ctrl().add_header('ERROR 5 Command not found'))
+        self.assertEqual(self.ctrl.receive('5', timeout=1), ['ERROR 5 Command not found'])
+        self.peer.sendall(Ctrl().add_header('ERROR err Command parser error.'))
+        self.assertEqual(self.ctrl.receive('6', timeout=1), ['ERROR err Command parser error.'])
+
+    def test_timeout(self):
+        self.peer.sendall(Ctrl().add_header('GET_REPLY 2 var'))
+        self.assertRaises(IOError, self.ctrl.receive, '1', 0.1)
+
+if __name__ == '__main__':
+    unittest.main()
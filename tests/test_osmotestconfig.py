@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+
+# unit tests for the config handling helpers of scripts/osmotestconfig.py
+
+import os, shutil, socket, sys, tempfile, unittest
+
+root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, root)
+sys.path.insert(0, os.path.join(root, 'scripts'))
+import osmotestconfig
+from osmotestconfig import config_lines, rewrite_ports
+from osmopy.osmo_interact.common import allocate_ports
+
+class RewritePortsTest(unittest.TestCase):
+    def test_binds_replaced(self):
+        config = ('! comment\n'
+                  'line vty\n'
+                  ' no login\n'
+                  ' bind 0.0.0.0 4242\n'
+                  'ctrl\n'
+                  ' bind 127.0.0.1\n'
+                  'e1_input\n'
+                  ' e1_line 0 driver ipa\n'
+                  ' ipa bind 192.168.0.1\n'
+                  'mgw 0\n'
+                  ' remote-ip 127.0.0.1\n'
+                  ' bind ip 10.0.0.1\n')
+        self.assertEqual(rewrite_ports(config, 42001, 42002),
+                         '! comment\n'
+                         'line vty\n'
+                         ' bind 127.0.0.1 42001\n'
+                         ' no login\n'
+                         'ctrl\n'
+                         ' bind 127.0.0.1 42002\n'
+                         'e1_input\n'
+                         ' e1_line 0 driver ipa\n'
+                         ' ipa bind 192.168.0.1\n'
+                         'mgw 0\n'
+                         ' remote-ip 127.0.0.1\n'
+                         ' bind ip 10.0.0.1\n')
+
+    def test_vty_added(self):
+        self.assertEqual(rewrite_ports('network\n network country code 1\n', 42001, 42002),
+                         'network\n network country code 1\nline vty\n bind 127.0.0.1 42001\n')
+
+    def test_no_ctrl_added(self):
+        self.assertNotIn('ctrl', rewrite_ports('line vty\n', 42001, 42002))
+
+class ConfigLinesTest(unittest.TestCase):
+    def lines(self, content):
+        with tempfile.NamedTemporaryFile('w', suffix='.cfg') as f:
+            f.write(content)
+            f.flush()
+            return config_lines(f.name)
+
+    def test_comments_ignored(self):
+        self.assertEqual(self.lines('!\n! Configuration saved\n!\nline vty\n bind 127.0.0.1  \n\n'),
+                         self.lines('line vty\n bind 127.0.0.1\n'))
+
+    def test_indentation_matters(self):
+        self.assertNotEqual(self.lines('network\n bts 0\n  trx 0\n'),
+                            self.lines('network\n bts 0\n trx 0\n'))
+
+# fake application: VTY on the port of the 'line vty' node, fails to start if
+# its fixed port (first argument) is taken, like apps without a 'ctrl' node
+FAKE_APP = """
+import socket, sys
+config = sys.argv[sys.argv.index('-c') + 1]
+lines = open(config).read().splitlines()
+fixed = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+fixed.bind(('127.0.0.1', int(sys.argv[1])))
+fixed.listen(1)
+vty_port = int([l for l in lines if l.startswith(' bind ')][0].split()[-1])
+srv = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+srv.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+srv.bind(('127.0.0.1', vty_port))
+srv.listen(5)
+while True:
+    (s, _) = srv.accept()
+    s.sendall(b'Welcome\\r\\nFake> ')
+    (buf, prompt) = (b'', 'Fake> ')
+    while True:
+        data = s.recv(100)
+        if not data:
+            break
+        buf += data
+        while b'\\r' in buf:
+            (line, buf) = buf.split(b'\\r', 1)
+            (line, out) = (line.decode(), '')
+            if line == 'enable':
+                prompt = 'Fake# '
+            elif line == 'show online-help':
+                out = '<command id="x"><doc>fine</doc></command>\\r\\n'
+            elif line == 'write':
+                with open(config, 'w') as f:
+                    f.write('\\n'.join(lines) + '\\n')
+                out = 'Configuration saved to %s\\r\\n' % config
+            s.sendall((line + '\\r\\n' + out + prompt).encode())
+    s.close()
+"""
+
+class ParallelTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        app = os.path.join(self.tmpdir, 'fake_app.py')
+        with open(app, 'w') as f:
+            f.write(FAKE_APP)
+        self.app = (0, '%s %s %d' % (sys.executable, app, allocate_ports(21000, 1)[0]), 'Fake', 'fake')
+        self.configs = []
+        for name in ('a.cfg', 'b.cfg'):
+            self.configs.append(os.path.join(self.tmpdir, name))
+            with open(self.configs[-1], 'w') as f:
+                f.write('line vty\n no login\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_same_app_without_ctrl(self):
+        tasks = [(self.app, c, os.path.join(self.tmpdir, str(n)), False, False) for (n, c) in enumerate(self.configs)]
+        self.assertEqual(osmotestconfig.test_configs_parallel(tasks, 2, 22000, verbose=False), 0)
+
+if __name__ == '__main__':
+    unittest.main()
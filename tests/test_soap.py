@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+
+# unit tests for the SOAP request queue of scripts/soap.py
+
+import logging, os, sys, unittest
+
+root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, root)
+sys.path.insert(0, os.path.join(root, 'scripts'))
+try:
+    from twisted.internet import defer
+    from soap import WorkQueue
+except ImportError as e:
+    raise unittest.SkipTest('soap.py dependencies are not available: %s' % e)
+
+class WorkQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.started = [] # (bsc, n, Deferred) of requests in-flight
+        self.queue = WorkQueue(2, 2, logging.getLogger('test'))
+
+    def request(self, bsc, n):
+        d = defer.Deferred()
+        self.started.append((bsc, n, d))
+        return d
+
+    def finish(self):
+        self.started.pop(0)[2].callback(None)
+
+    def test_limit(self):
+        for n in range(4):
+            self.queue.put('bsc%d' % n, self.request, 'bsc%d' % n, n)
+        self.assertEqual([n for (_, n, _) in self.started], [0, 1])
+        self.assertEqual((self.queue.in_flight, self.queue.pending), (2, 2))
+        self.finish()
+        self.assertEqual([n for (_, n, _) in self.started], [1, 2])
+        self.finish()
+        self.finish()
+        self.finish()
+        self.assertEqual((self.queue.in_flight, self.queue.pending, self.queue.dropped), (0, 0, 0))
+
+    def test_depth(self):
+        self.queue.put('busy', self.request, 'busy', 0)
+        self.queue.put('busy', self.request, 'busy', 1)
+        for n in range(2, 6):
+            self.queue.put('bsc', self.request, 'bsc', n)
+        self.assertEqual(self.queue.pending, 2)
+        self.assertEqual(self.queue.dropped, 2)
+        self.finish()
+        self.finish()
+        # oldest requests of the BSC were dropped, the rest keeps the order of arrival
+        self.assertEqual([n for (_, n, _) in self.started], [4, 5])
+
+    def test_unlimited_depth(self):
+        self.queue = WorkQueue(1, None, logging.getLogger('test'))
+        for n in range(5):
+            self.queue.put('bsc', self.request, 'bsc', n)
+        self.assertEqual((self.queue.pending, self.queue.dropped), (4, 0))
+
+    def test_failed_request_releases_slot(self):
+        self.queue.put('bsc', self.request, 'bsc', 0)
+        self.queue.put('bsc', self.request, 'bsc', 1)
+        self.queue.put('bsc', self.request, 'bsc', 2)
+        d = self.started.pop(0)[2]
+        d.addErrback(lambda _: None)
+        d.errback(Exception('HTTP error'))
+        self.assertEqual([n for (_, n, _) in self.started], [1, 2])
+        self.assertEqual(self.queue.in_flight, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+
+# unit tests for the CTRL variable store of osmopy.twisted_ipa
+
+import io, os, sys, unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+try:
+    from osmopy.twisted_ipa import CtrlStore
+except ImportError as e:
+    raise unittest.SkipTest('twisted is not available: %s' % e)
+
+class CtrlStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.store = CtrlStore()
+        self.store.load(io.StringIO('# comment\n\nbts.0.name first\nro bts.0.type sysmobts\nbts.1.name second\n'))
+
+    def test_get_set(self):
+        self.assertEqual(self.store.get('bts.0.name'), 'first')
+        self.assertEqual(self.store.set('bts.0.name', 'changed'), 'changed')
+        self.assertEqual(self.store.get('bts.0.name'), 'changed')
+
+    def test_unknown(self):
+        self.assertRaises(KeyError, self.store.get, 'bts.2.name')
+        self.assertRaises(KeyError, self.store.get, 'bts.0') # inner node, not a variable
+        self.assertRaises(KeyError, self.store.set, 'bts.2.name', 'x')
+
+    def test_read_only(self):
+        self.assertRaises(ValueError, self.store.set, 'bts.0.type', 'x')
+        self.assertEqual(self.store.get('bts.0.type'), 'sysmobts')
+
+    def test_list(self):
+        self.assertEqual(self.store.get('bts.0.*'), 'name;type')
+        self.assertEqual(self.store.get('bts.*'), '0.name;0.type;1.name')
+
+    def test_callbacks(self):
+        def check(path, value):
+            if not value.isdigit():
+                raise ValueError('Invalid value')
+            return str(int(value))
+        self.store.add('counter', get=lambda path: '42')
+        self.store.add('level', '0', set=check)
+        self.assertEqual(self.store.get('counter'), '42')
+        self.assertEqual(self.store.set('level', '007'), '7')
+        self.assertRaises(ValueError, self.store.set, 'level', 'high')
+        self.assertEqual(self.store.get('level'), '7')
+
+    def test_delegate(self):
+        calls = []
+        self.store.delegate('rate_ctr', lambda rest, value: calls.append((rest, value)) or 'handled')
+        self.assertEqual(self.store.get('rate_ctr.abs.bts.0'), 'handled')
+        self.assertEqual(self.store.set('rate_ctr.reset', '1'), 'handled')
+        self.assertEqual(calls, [('abs.bts.0', None), ('reset', '1')])
+
+if __name__ == '__main__':
+    unittest.main()